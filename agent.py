@@ -10,15 +10,123 @@ trained model. The RL Agent is trained via Q-learning.
 # General Public License along with this program.  
 # If not, see <https://www.gnu.org/licenses/>.
 
+from tapnswap import (N_STATES, ACTIONS, LEGAL, LEGAL_CODES, GAME_OVER, 
+                      CANONICAL, CANONICAL_ACTION, pack_state, 
+                      unpack_state, action_code, reachable_states)
+import model_io
 import numpy as np
+import os
+
+
+def pair_index(hand0, hand1):
+  """
+  Index of a pair of hands in the state coder of RLAgent: pairs with 
+  different hands come first, ordered by (hand0, hand1), then pairs 
+  with identical hands.
+  """
+
+  if hand0 == hand1:
+    return 20 + hand0
+  return 4 * hand0 + hand1 - int(hand1 > hand0)
+
+
+# RLAgent state index of each packed state (see tapnswap.pack_state)
+STATE_INDEX = [ pair_index(state // 125, state // 25 % 5) * 25 + 
+                pair_index(state // 5 % 5, state % 5) 
+                for state in range(N_STATES) ]
+
+# Game over states in RLAgent state indices
+DONE_INDEX = np.zeros(N_STATES, dtype = bool)
+DONE_INDEX[STATE_INDEX] = GAME_OVER
+
+# Compact layout of Q (see CompactRLAgent): possible actions of states
+# reachable from the starting position, stored state after state (CSR).
+# Pairs of state PAIR_PTR[state] to PAIR_PTR[state + 1] - 1 have
+# actions PAIR_CODES and packed states PAIR_STATES
+REACHABLE = reachable_states()
+_n_pairs = np.zeros(N_STATES, dtype = np.int64)
+_n_pairs[REACHABLE] = [ len(LEGAL_CODES[state]) for state in REACHABLE ]
+PAIR_PTR = np.concatenate(([0], np.cumsum(_n_pairs)))
+PAIR_CODES = np.concatenate([ LEGAL_CODES[state] for state in REACHABLE ])
+PAIR_STATES = np.repeat(np.arange(N_STATES), _n_pairs)
+N_PAIRS = len(PAIR_CODES)
+# _PAIR_INDEX[state][code]: index of pair (-1 if not in layout)
+_PAIR_INDEX = [ [-1] * len(ACTIONS) for _ in range(N_STATES) ]
+for _pair, (_state, _code) in enumerate(zip(PAIR_STATES.tolist(), 
+                                            PAIR_CODES.tolist())):
+  _PAIR_INDEX[_state][_code] = _pair
+# Row of each pair in the dense Q function of RLAgent
+PAIR_ROWS = np.array(STATE_INDEX)[PAIR_STATES]
+# _PAIRS[state]: indices of pairs of state
+_PAIRS = [ list(range(PAIR_PTR[state], PAIR_PTR[state + 1])) 
+            for state in range(N_STATES) ]
+
+# Canonical layout of Q (see CanonicalRLAgent): one row for each 
+# representative state under the swaps of left and right hands
+CANONICAL_STATES = np.unique(CANONICAL)
+CANONICAL_INDEX = np.searchsorted(CANONICAL_STATES, CANONICAL)
+# Possible actions in the dense layout of RLAgent and their entries in 
+# the canonical layout
+_legal_states, LEGAL_ACTIONS = np.nonzero(LEGAL)
+LEGAL_ROWS = np.array(STATE_INDEX)[_legal_states]
+CANONICAL_ROWS = CANONICAL_INDEX[_legal_states]
+CANONICAL_CODES = CANONICAL_ACTION[_legal_states, LEGAL_ACTIONS]
+# Python lists for scalar lookups
+_CANONICAL_INDEX = CANONICAL_INDEX.tolist()
+_CANONICAL_ACTION = CANONICAL_ACTION.tolist()
+
+# Coders and decoders of RLAgent, built once for all agents
+N_ACTIONS = len(ACTIONS)
+# STATE_DECODER[idx]: state of RLAgent index idx in TapnSwap format
+STATE_DECODER = np.zeros((N_STATES, 2, 2), dtype = np.int64)
+STATE_DECODER[STATE_INDEX] = [ unpack_state(state) 
+                                for state in range(N_STATES) ]
+# ACTION_DECODER[code]: action of code in TapnSwap format
+ACTION_DECODER = np.array(ACTIONS, dtype = np.int64)
+# Dictionaries {tupled state or action: idx}
+STATE_CODER = { tuple(map(tuple, raw_state)): idx 
+                for idx, raw_state in enumerate(STATE_DECODER.tolist()) }
+ACTION_CODER = { tuple(raw_action): code 
+                  for code, raw_action in enumerate(ACTIONS) }
+
+
+def spawn_rngs(seed, n):
+  """
+  Independent random generators derived from a master seed, for 
+  instance one for each agent or parallel worker.
+
+  Parameters
+  ----------
+  seed: int, np.random.SeedSequence (or None)
+    Master seed (fresh entropy from the OS if None).
+  n: int
+    Number of generators.
+
+  Return
+  ------
+  rngs: list of n np.random.Generator.
+  """
+
+  if not isinstance(seed, np.random.SeedSequence):
+    seed = np.random.SeedSequence(seed)
+  return [ np.random.default_rng(child) for child in seed.spawn(n) ]
+
 
 class Agent:
   """
   Class of agent used to play with user and used for training.
   """
 
-  def __init__(self):
-    pass
+  def __init__(self, rng = None):
+    """
+    Parameter
+    ---------
+    rng: np.random.Generator, int, np.random.SeedSequence (or None)
+      Random generator of the agent, or seed used to create it 
+      (fresh entropy from the OS if None).
+    """
+
+    self.rng = np.random.default_rng(rng)
 
   def random_action(self, actions):
     """
@@ -35,10 +143,7 @@ class Agent:
     format used by TapnSwap).
     """
 
-    # Fix seed
-    np.random.seed()
-
-    return actions[ np.random.randint(0, len(actions)) ]
+    return actions[ self.rng.integers(len(actions)) ]
 
   def choose_action(self, state, actions, greedy = False):
     pass
@@ -46,6 +151,68 @@ class Agent:
   def update_Q(self, raw_state, raw_action, reward, raw_next_state):
     pass
 
+  def is_deterministic(self, greedy = False):
+    """
+    Whether the decisions of the agent only depend on the current 
+    state (same action each time a state is seen). Used to end games 
+    stuck in a loop of positions.
+
+    Parameter
+    ---------
+    greedy: boolean
+      Same as in choose_action.
+
+    Return
+    ------
+    boolean (False by default).
+    """
+
+    return False
+
+  def choose_code(self, state, codes, greedy = False):
+    """
+    Choose an action from a packed state among codes of possible 
+    actions. By default, it goes through choose_action (TapnSwap format).
+
+    Parameters
+    ----------
+    state: int
+      Packed state seen by the agent (see tapnswap.pack_state).
+    codes: tuple of int
+      Codes of possible actions (indices in tapnswap.ACTIONS).
+    greedy: boolean
+      Same as in choose_action.
+
+    Return
+    ------
+    code: int
+      Code of action chosen by agent.
+    """
+
+    hands = unpack_state(state)
+    raw_actions = [ACTIONS[code] for code in codes]
+    return action_code(self.choose_action([hands[0], hands[1]], 
+                                          raw_actions, greedy = greedy))
+
+  def update_Q_code(self, state, code, reward, next_state):
+    """
+    Same as update_Q with packed states and code of action. By default, 
+    it goes through update_Q (TapnSwap format).
+    """
+
+    hands = unpack_state(state)
+    next_hands = unpack_state(next_state)
+    self.update_Q([hands[0], hands[1]], ACTIONS[code], reward, 
+                  [next_hands[0], next_hands[1]])
+
+  def flush(self):
+    """
+    Apply the pending updates of the Q function (none by default, see 
+    RLAgent.flush).
+    """
+
+    pass
+
 
 class RandomAgent(Agent):
   """
@@ -59,15 +226,91 @@ class RandomAgent(Agent):
 
     return self.random_action(actions)
 
+  def choose_code(self, state, codes, greedy = False):
+    """
+    Choose a purely random action among codes of possible actions.
+    """
+
+    return self.random_action(codes)
+
+  def update_Q_code(self, state, code, reward, next_state):
+    pass
+
+
+class ReplayBuffer:
+  """
+  Ring buffer of transitions (state, action, reward, next_state, done) 
+  stored in arrays, with states in RLAgent format.
+  """
+
+  def __init__(self, capacity):
+    """
+    Parameter
+    ---------
+    capacity: int
+      Maximum number of stored transitions (the oldest ones are 
+      overwritten beyond).
+    """
+
+    self.capacity = capacity
+    self.states = np.zeros(capacity, dtype = np.int64)
+    self.actions = np.zeros(capacity, dtype = np.int64)
+    self.rewards = np.zeros(capacity)
+    self.next_states = np.zeros(capacity, dtype = np.int64)
+    self.done = np.zeros(capacity, dtype = bool)
+    self.position = 0
+    self.size = 0
+
+  def __len__(self):
+    return self.size
+
+  def add(self, state, action, reward, next_state, done):
+    """
+    Store a transition.
+    """
+
+    i = self.position
+    self.states[i] = state
+    self.actions[i] = action
+    self.rewards[i] = reward
+    self.next_states[i] = next_state
+    self.done[i] = done
+    self.position = (i + 1) % self.capacity
+    self.size = min(self.size + 1, self.capacity)
+
+  def transitions(self):
+    """
+    Stored transitions, from the oldest to the newest.
+
+    Return
+    ------
+    states, actions, rewards, next_states, done: np.arrays.
+    """
+
+    order = np.arange(self.position - self.size, self.position)
+    order %= self.capacity
+    return (self.states[order], self.actions[order], self.rewards[order],
+            self.next_states[order], self.done[order])
+
+  def clear(self):
+    """
+    Remove all transitions.
+    """
+
+    self.position = 0
+    self.size = 0
+
 
 class RLAgent(Agent):
   """
   Class of agent trained by Q-learning.
   """
 
-  def __init__(self, epsilon = 0.0, gamma = 1.0):
+  def __init__(self, epsilon = 0.0, gamma = 1.0, rng = None, 
+                replay_size = None, flush_mode = 'deferred', 
+                q_dtype = np.float64, count_dtype = np.uint32):
     """
-    Build a coder and decoder of states and actions from 
+    Give access to the coder and decoder of states and actions from 
     TapnSwap format to integers.
 
     Parameters
@@ -76,74 +319,94 @@ class RLAgent(Agent):
       Fraction of greedy random decisions.
     gamma: float (in [0,1])
       Factor of significance of first actions over last ones.
+    rng: np.random.Generator, int, np.random.SeedSequence (or None)
+      Random generator of the agent (see Agent).
+    replay_size: int (or None)
+      If None, the Q function is updated at each transition. Otherwise, 
+      transitions are stored in a ReplayBuffer of this size and applied 
+      by batches (see update_Q_batch).
+    flush_mode: 'deferred' or 'immediate'
+      With a ReplayBuffer, apply the stored transitions by batches when 
+      the buffer is full or when flush is called ('deferred'), or apply
+      each transition at once and keep the last ones in the buffer 
+      ('immediate').
+    q_dtype: NumPy float dtype
+      Storage type of Q function (float64, float32 or float16). 
+      Computations of updates are done in float64.
+    count_dtype: NumPy dtype
+      Storage type of the counter of state-action pairs (unsigned 
+      integer or float). Integer counters stop at their maximum value 
+      (the learning rate then stays at its minimum).
     """
 
-    # Get integer coding of each state of original format
+    Agent.__init__(self, rng)
+
+    # Integer coding of each state of original format
     # [ [hand0_p0, hand1_p0], [hand0_p1, hand1_p1] ]
     self.build_state_coder()
 
-    # Get integer coding of each action of original format
+    # Integer coding of each action of original format
     # [0/1, 0/1, 0/1/2]
     self.build_action_coder()
 
     # Init Q function
     n_states = len(self.state_coder)
     n_actions = len(self.action_coder)
-    self.Q = np.zeros( (n_states, n_actions) )
-    self.count_state_action = np.zeros( (n_states, n_actions) )
+    self.q_dtype = np.dtype(q_dtype)
+    self.count_dtype = np.dtype(count_dtype)
+    self.Q = np.zeros( (n_states, n_actions), dtype = self.q_dtype )
+    self.count_state_action = np.zeros( (n_states, n_actions), 
+                                        dtype = self.count_dtype )
+    # Saturation of counter
+    if self.count_dtype.kind in 'ui':
+      self.count_max = int(np.iinfo(self.count_dtype).max)
+    else:
+      self.count_max = np.inf
 
     # Parameters of agent
     self.epsilon = epsilon
     self.gamma = gamma
 
+    # Information on the model (see save_model)
+    self.metadata = {'epsilon': epsilon, 'gamma': gamma}
+
+    # Buffer of transitions for batched updates
+    assert flush_mode in ['deferred', 'immediate'], \
+    'Unknown flush mode {}.'.format(flush_mode)
+    self.flush_mode = flush_mode
+    self.replay = None
+    if replay_size is not None:
+      self.replay = ReplayBuffer(replay_size)
+
 
   def build_state_coder(self):
     """
-    Build a dictionary {state: idx} where: 
+    Give access to the dictionary {state: idx} (shared by all RL Agents, 
+    see STATE_CODER) where: 
     * state is a tupled version of the state in format given by 
       TapnSwap instance -> ex: ( (1,1), (1,1) ).
     * idx is its coding integer.
     """
 
-    # First build list of states for 1 pair of hands
-    list_states_pair0_diff = [ [i,j] for i in range(5) for j in range(5) 
-                                if i != j  ] 
-    list_states_pair0_eq = [ [i,j] for i in range(5) for j in range(5) 
-                                if (i == j)] 
-    list_states_pair0 = list_states_pair0_diff + list_states_pair0_eq 
-
-    # Then build list of states for 2 pairs
-    list_states = [ tuple(( tuple(state_pair0), tuple(state_pair1) ))
-                    for state_pair0 in list_states_pair0 
-                    for state_pair1 in list_states_pair0 ]
-
-    # Build dictionary
-    self.state_coder = {state: i for i, state in enumerate(list_states)}
+    self.state_coder = STATE_CODER
 
 
   def build_action_coder(self):
     """
-    Build a dictionary {action: idx} where:
+    Give access to the dictionary {action: idx} (shared by all RL Agents, 
+    see ACTION_CODER) where:
     * action is a tupled version of the action in format given by
       TapnSwap instance -> ex: (0,1,0).
     * idx is its coding integer.
     """
 
-    # Build list of all actions
-    list_actions_tap = [ tuple([0, i, j]) for i in range(2) 
-                          for j in range(2) ]
-    list_actions_swap = [ tuple([1, i, j]) for i in range(2) 
-                          for j in range(1,3) ]
-    list_actions = list_actions_tap + list_actions_swap
-
-    # Build dictionary
-    self.action_coder = {action: i for i, action in enumerate(list_actions)}
+    self.action_coder = ACTION_CODER
 
 
   def code_state(self, raw_state):
     """
     Code raw state from TapnSwap format to 
-    agent state format (integer) using dictionary state_coder.
+    agent state format (integer), computed from the numbers of fingers.
 
     Parameter
     ---------
@@ -155,17 +418,16 @@ class RLAgent(Agent):
     Corresponding state in agent format (int).
     """
 
-    # Tupled version of raw state
-    raw_state_t = tuple(( tuple(raw_state[0]), tuple(raw_state[1])  ))    
-    assert raw_state_t in self.state_coder.keys(), \
-    'The state {} is not in dictionary of states.'.format(raw_state_t)
-    return self.state_coder[ raw_state_t ]
+    (h0, h1), (h2, h3) = raw_state
+    assert 0 <= h0 < 5 and 0 <= h1 < 5 and 0 <= h2 < 5 and 0 <= h3 < 5, \
+    'The state {} is not in dictionary of states.'.format(raw_state)
+    return STATE_INDEX[((h0 * 5 + h1) * 5 + h2) * 5 + h3]
 
 
   def code_actions(self, raw_actions):
     """
     Code raw actions from TapnSwap format to 
-    agent actions format (integers) using dictionary action_coder.
+    agent actions format (integers), computed from the action values.
 
     Parameter
     ---------
@@ -182,14 +444,14 @@ class RLAgent(Agent):
     if type( raw_actions[0] ) != list:
       raw_actions = [ raw_actions ]
 
-    # Tupled version of raw_actions
-    raw_actions_t = [ tuple( raw_action ) for raw_action in raw_actions ] 
-    problem_actions = [raw_action_t for raw_action_t in raw_actions_t 
-                        if raw_action_t not in self.action_coder.keys() ]
+    actions = [ action_code(raw_action) for raw_action in raw_actions ]
+    problem_actions = [ raw_action for raw_action, action 
+                        in zip(raw_actions, actions) 
+                        if not 0 <= action < N_ACTIONS 
+                        or ACTIONS[action] != list(raw_action) ]
     assert len(problem_actions) == 0, \
     'The actions {} are not in dictionary of actions.'.format(problem_actions)
-    return [ self.action_coder[raw_action_t] 
-            for raw_action_t in raw_actions_t ]
+    return actions
 
 
   def decode_action(self, action):
@@ -207,13 +469,7 @@ class RLAgent(Agent):
     Corresponding action in TapnSwap format.
     """
 
-    # Tupled version of action, found in dictionary of actions
-    action_t = list(self.action_coder.keys())[
-              list(self.action_coder.values()).index(action)]
-    assert type(action_t) == tuple, \
-    'Several actions returned by RL agent: {}'.format(action_t)
-    # Decoding into TapnSwap format
-    return list(action_t)
+    return ACTION_DECODER[action].tolist()
 
 
   def decode_state(self, state):
@@ -231,11 +487,7 @@ class RLAgent(Agent):
     Corresponding state in TapnSwap format.
     """
 
-    # Tupled version of state, found in dictionary of states
-    state_t = list(self.state_coder.keys())[
-              list(self.state_coder.values()).index(state)]
-    # Decoding into TapnSwap format
-    return list(state_t)
+    return [ tuple(pair) for pair in STATE_DECODER[state].tolist() ]
 
 
   def choose_action(self, raw_state, raw_actions, greedy = False):
@@ -270,8 +522,7 @@ class RLAgent(Agent):
     epsilon = float(greedy) * self.epsilon
     
     # Exploration   
-    np.random.seed()
-    if np.random.random() <= epsilon:
+    if epsilon > 0 and self.rng.random() <= epsilon:
       assert greedy == True, \
       'Agent is epsilon greedy while it should not !'
       action = self.random_action(actions)
@@ -306,37 +557,770 @@ class RLAgent(Agent):
 
     # Decoding into agent format
     state = self.code_state(raw_state)
-    action = self.code_actions(raw_action)
+    action = self.code_actions(raw_action)[0]
     next_state = self.code_state(raw_next_state)
 
+    if self.replay is not None:
+      self.store_transition(state, action, reward, next_state)
+    else:
+      self.update_Q_index(state, action, reward, next_state)
+
+
+  def choose_code(self, state, codes, greedy = False):
+    """
+    Same as choose_action with a packed state and codes of actions 
+    (the codes of actions are the agent format of actions).
+
+    Parameters
+    ----------
+    state: int
+      Packed state seen by the agent (see tapnswap.pack_state).
+    codes: tuple of int
+      Codes of possible actions.
+    greedy: boolean
+      Same as in choose_action.
+
+    Return
+    ------
+    code: int
+      Code of action chosen by agent.
+    """
+
+    epsilon = float(greedy) * self.epsilon
+
+    # Exploration
+    if epsilon > 0 and self.rng.random() <= epsilon:
+      assert greedy == True, \
+      'Agent is epsilon greedy while it should not !'
+      return self.random_action(codes)
+
+    # Exploitation
+    q = self.Q[STATE_INDEX[state], list(codes)]
+    return codes[np.argmax(q)]
+
+
+  def is_deterministic(self, greedy = False):
+    """
+    Optimal decisions (greedy = False) only depend on the current state.
+    """
+
+    return not greedy
+
+
+  def update_Q_code(self, state, code, reward, next_state):
+    """
+    Same as update_Q with packed states and code of action.
+
+    Parameters
+    ----------
+    state: int
+      Packed current state seen by the agent.
+    code: int
+      Code of current action.
+    reward: float
+      Current reward.
+    next_state: int
+      Packed next state seen by the agent.
+    """
+
+    if self.replay is not None:
+      self.store_transition(STATE_INDEX[state], code, reward, 
+                            STATE_INDEX[next_state])
+    else:
+      self.update_Q_index(STATE_INDEX[state], code, reward, 
+                          STATE_INDEX[next_state])
+
+
+  def update_Q_index(self, state, action, reward, next_state):
+    """
+    Update of Q function using Temporal Difference on current 
+    transition in agent format, with dynamic learning rate.
+
+    Parameters
+    ----------
+    state: int
+      Current state in agent format.
+    action: int
+      Current action in agent format.
+    reward: float
+      Current reward.
+    next_state: int
+      Next state in agent format.
+    """
+
+    # Shared model (or one of its arrays)
+    if not (self.Q.flags.writeable and 
+            self.count_state_action.flags.writeable):
+      self.own_arrays()
+
     # Compute Temporal Difference (TD)
     delta_t = (reward + 
-              self.gamma * max(self.Q[next_state, :]) - 
-              self.Q[state, action])
+              self.gamma * float(self.Q[next_state, :].max()) - 
+              float(self.Q[state, action]))
     # Update learning rate
-    self.count_state_action[state, action] += 1
+    if self.count_state_action[state, action] < self.count_max:
+      self.count_state_action[state, action] += 1
     lr = 1.0/float( self.count_state_action[state, action] )
 
     #Update Q value
     self.Q[state, action] +=  lr * delta_t
 
 
-  def load_model(self, filename):
+  def store_transition(self, state, action, reward, next_state):
+    """
+    Store a transition in the ReplayBuffer and apply the stored 
+    transitions according to flush_mode.
+
+    Parameters
+    ----------
+    state: int
+      Current state in agent format.
+    action: int
+      Current action in agent format.
+    reward: float
+      Current reward.
+    next_state: int
+      Next state in agent format.
+    """
+
+    if self.flush_mode == 'immediate':
+      # Keep the transition and apply it at once
+      self.replay.add(state, action, reward, next_state, 
+                      DONE_INDEX[next_state])
+      self.update_Q_index(state, action, reward, next_state)
+      return
+
+    self.replay.add(state, action, reward, next_state, 
+                    DONE_INDEX[next_state])
+    if len(self.replay) == self.replay.capacity:
+      self.flush()
+
+
+  def flush(self):
+    """
+    Apply the transitions stored in the ReplayBuffer (if any) to the 
+    Q function and empty the buffer (in immediate flush mode, they are
+    already applied and are kept).
+    """
+
+    if (self.replay is not None and len(self.replay) > 0 
+        and self.flush_mode == 'deferred'):
+      self.update_Q_batch(*self.replay.transitions())
+      self.replay.clear()
+
+
+  def update_Q_batch(self, states, actions, rewards, next_states, done):
+    """
+    Update of Q function with a batch of transitions. Targets of 
+    Temporal Difference are computed with the current Q function, then 
+    each state-action pair is updated as with update_Q (learning rate 
+    1/count) applied to its targets one after the other: its value 
+    becomes the running mean of its targets. With a single transition, 
+    it is the same update as update_Q.
+
+    Parameters
+    ----------
+    states, actions: np.arrays of int
+      States and actions in agent format.
+    rewards: np.array of float.
+    next_states: np.array of int
+      Next states in agent format.
+    done: np.array of boolean
+      Game over at next states (no future reward).
+    """
+
+    # Shared model (or one of its arrays)
+    if not (self.Q.flags.writeable and 
+            self.count_state_action.flags.writeable):
+      self.own_arrays()
+
+    targets = rewards + self.gamma * np.where(done, 0.0, 
+                      self.Q[next_states].max(axis = 1).astype(np.float64))
+
+    # Sum of targets and number of transitions of each pair
+    n_actions = self.Q.shape[1]
+    pairs, inverse = np.unique(states * n_actions + actions, 
+                                return_inverse = True)
+    sums = np.zeros(len(pairs))
+    np.add.at(sums, inverse, targets)
+    counts = np.bincount(inverse, minlength = len(pairs))
+    states = pairs // n_actions
+    actions = pairs % n_actions
+
+    # Update learning rate (counters saturate) and Q values
+    new_counts = np.minimum(
+      self.count_state_action[states, actions].astype(np.float64) + counts, 
+      self.count_max)
+    self.count_state_action[states, actions] = new_counts
+    lr = 1.0 / new_counts
+    q = self.Q[states, actions].astype(np.float64)
+    self.Q[states, actions] = q + lr * (sums - counts * q)
+
+
+  def compile_policy(self):
+    """
+    Compile the optimal decisions of the agent (greedy = False) into a 
+    table of actions. Ties between actions are broken as in 
+    choose_code, by the order of TapnSwap.list_actions.
+
+    Return
+    ------
+    policy: np.array of N_STATES int8
+      Code of chosen action for each packed state (seen by the player 
+      who moves), -1 for game over states.
+    """
+
+    policy = np.full(N_STATES, -1, dtype = np.int8)
+    for state in range(N_STATES):
+      codes = LEGAL_CODES[state]
+      if len(codes) > 0:
+        policy[state] = codes[np.argmax(self.Q[STATE_INDEX[state], codes])]
+    return policy
+
+
+  def load_model(self, filename, load_rng = False, mmap_mode = None, 
+                  cache = True):
+    """
+    Load trained model in which is stored the trained matrix Q and 
+    the counter of state-action pairs for future training. Update the 
+    variables self.Q, self.count_state_action and self.metadata, 
+    converted to the storage types of the agent.
+
+    Parameters
+    ----------
+    filename : string
+      The path to the binary model is ./Models/filename.model (see 
+      model_io). If it does not exist, the model is read in the legacy 
+      CSV format: the path to Q matrix CSV file is 
+      ./Models/filename.csv while the counter of state-action pairs is 
+      located at ./Models/data/count_filename.csv.
+    load_rng: boolean
+      Set to True to resume the random generator of the agent from 
+      the state saved with the model (if any), for instance to 
+      continue a training.
+    mmap_mode: None, 'r', 'r+' or 'c'
+      Memory-map the arrays of a binary model with this mode 
+      (see np.memmap) instead of reading them (without cache).
+    cache: boolean
+      Set to True to load the model through model_io.MODEL_CACHE: 
+      the arrays are then shared (read-only) with other agents 
+      loading the same model, and copied at the first update.
+    """
+
+    path = model_io.model_path(filename)
+    if mmap_mode is not None and os.path.exists(path):
+      self.Q, self.count_state_action, self.metadata = model_io.load_model(
+                                              path, mmap_mode = mmap_mode)
+    elif cache:
+      self.Q, self.count_state_action, self.metadata = \
+                                      model_io.MODEL_CACHE.load(filename)
+    elif os.path.exists(path):
+      self.Q, self.count_state_action, self.metadata = model_io.load_model(
+                                                                    path)
+    else:
+      self.Q, self.count_state_action, self.metadata = \
+                                          model_io.load_csv_model(filename)
+
+    # Storage types of agent (arrays are copied if types differ)
+    self.Q = self.Q.astype(self.q_dtype, copy = False)
+    self.count_state_action = self.count_state_action.astype(
+                                          self.count_dtype, copy = False)
+
+    # State of random generator
+    if load_rng and 'rng_state' in self.metadata:
+      self.rng.bit_generator.state = self.metadata['rng_state']
+
+
+  def own_arrays(self):
+    """
+    Copy the arrays of the model if they are read-only (shared through 
+    the cache of models or memory-mapped), before updating them.
+    """
+
+    if not self.Q.flags.writeable:
+      self.Q = np.array(self.Q)
+    if not self.count_state_action.flags.writeable:
+      self.count_state_action = np.array(self.count_state_action)
+
+
+  def save_model(self, filename, metadata = None):
     """
-    Load trained model of format CSV in which is stored 
-    the trained matrix Q and the counter of state-action pairs
-    for future training. Update the variables self.Q and 
-    self.count_state_action.
+    Save the model in binary format at ./Models/filename.model (see 
+    model_io), along with its metadata and the state of the random 
+    generator of the agent.
+
+    Parameters
+    ----------
+    filename : string
+      Name of the model.
+    metadata: dict (or None)
+      Information on the model (epsilon, gamma, epochs, opponents...) 
+      updating self.metadata.
+    """
+
+    if metadata is not None:
+      self.metadata.update(metadata)
+    self.metadata['rng_state'] = self.rng.bit_generator.state
+    model_io.save_model(model_io.model_path(filename), self.Q, 
+                        self.count_state_action, self.metadata)
+
+
+class CompactRLAgent(RLAgent):
+  """
+  Class of agent trained by Q-learning, storing its Q function only 
+  for the possible actions of states reachable from the starting 
+  position (N_PAIRS values instead of 625 x 8, see PAIR_PTR). Its 
+  decisions and updates are the same as those of RLAgent: actions out 
+  of the layout have value 0, as in the dense Q function where they are 
+  never updated. Replay buffers are not supported.
+  """
+
+  def __init__(self, epsilon = 0.0, gamma = 1.0, rng = None, 
+                replay_size = None, q_dtype = np.float64, 
+                count_dtype = np.uint32):
+    """
+    Same parameters as RLAgent (replay_size must be None).
+    """
+
+    assert replay_size is None, \
+    'Replay buffers are not supported by the compact layout.'
+    RLAgent.__init__(self, epsilon, gamma, rng = rng, q_dtype = q_dtype, 
+                      count_dtype = count_dtype)
+
+
+  # Dense layout (RLAgent format) of Q and counter, for compatibility
+  @property
+  def Q(self):
+    return self.to_dense()[0]
+
+  @Q.setter
+  def Q(self, Q):
+    self.values = np.asarray(Q)[PAIR_ROWS, PAIR_CODES].astype(self.q_dtype)
+
+  @property
+  def count_state_action(self):
+    return self.to_dense()[1]
+
+  @count_state_action.setter
+  def count_state_action(self, count):
+    self.counts = np.asarray(count)[PAIR_ROWS, PAIR_CODES].astype(
+                                                          self.count_dtype)
+
+
+  def to_dense(self):
+    """
+    Q function and counter of state-action pairs in the dense layout 
+    of RLAgent.
+
+    Return
+    ------
+    Q, count: np.arrays of shape (625, 8).
+    """
+
+    Q = np.zeros((N_STATES, len(ACTIONS)), dtype = self.q_dtype)
+    count = np.zeros((N_STATES, len(ACTIONS)), dtype = self.count_dtype)
+    Q[PAIR_ROWS, PAIR_CODES] = self.values
+    count[PAIR_ROWS, PAIR_CODES] = self.counts
+    return Q, count
+
+
+  def from_dense(self, Q, count):
+    """
+    Set the Q function and the counter of state-action pairs from the 
+    dense layout of RLAgent (values out of the compact layout are 
+    dropped).
+    """
+
+    self.Q = Q
+    self.count_state_action = count
+
+
+  def value(self, state):
+    """
+    Maximum value of Q at a packed state (0 for actions out of the 
+    layout).
+    """
+
+    best = 0.0
+    for pair in _PAIRS[state]:
+      if self.values[pair] > best:
+        best = float(self.values[pair])
+    return best
+
+
+  def choose_action(self, raw_state, raw_actions, greedy = False):
+    """
+    Same as RLAgent.choose_action.
+    """
+
+    codes = [ action_code(raw_action) for raw_action in raw_actions ]
+    return ACTIONS[self.choose_code(pack_state(raw_state), codes, 
+                                    greedy = greedy)]
+
+
+  def choose_code(self, state, codes, greedy = False):
+    """
+    Same as RLAgent.choose_code.
+    """
+
+    epsilon = float(greedy) * self.epsilon
+
+    # Exploration
+    if epsilon > 0 and self.rng.random() <= epsilon:
+      return self.random_action(codes)
+
+    # Exploitation (first action of maximum value)
+    pairs = _PAIR_INDEX[state]
+    best_code = codes[0]
+    best = None
+    for code in codes:
+      pair = pairs[code]
+      q = self.values[pair] if pair >= 0 else 0.0
+      if best is None or q > best:
+        best = q
+        best_code = code
+    return best_code
+
+
+  def update_Q(self, raw_state, raw_action, reward, raw_next_state):
+    """
+    Same as RLAgent.update_Q.
+    """
+
+    self.update_Q_code(pack_state(raw_state), action_code(raw_action), 
+                        reward, pack_state(raw_next_state))
+
+
+  def update_Q_code(self, state, code, reward, next_state):
+    """
+    Same as RLAgent.update_Q_code.
+    """
+
+    pair = _PAIR_INDEX[state][code]
+    assert pair >= 0, \
+    'The action {} at state {} is not in the compact layout.'.format(
+                                                      ACTIONS[code], state)
+
+    # Compute Temporal Difference (TD)
+    delta_t = (reward + self.gamma * self.value(next_state) - 
+                float(self.values[pair]))
+    # Update learning rate
+    if self.counts[pair] < self.count_max:
+      self.counts[pair] += 1
+    lr = 1.0/float( self.counts[pair] )
+
+    #Update Q value
+    self.values[pair] += lr * delta_t
+
+
+  def compile_policy(self):
+    """
+    Same as RLAgent.compile_policy.
+    """
+
+    policy = np.full(N_STATES, -1, dtype = np.int8)
+    for state in range(N_STATES):
+      codes = LEGAL_CODES[state]
+      if len(codes) > 0:
+        policy[state] = self.choose_code(state, codes)
+    return policy
+
+
+  def save_model(self, filename, metadata = None):
+    """
+    Same as RLAgent.save_model (in the dense layout).
+    """
+
+    if metadata is not None:
+      self.metadata.update(metadata)
+    self.metadata['rng_state'] = self.rng.bit_generator.state
+    Q, count = self.to_dense()
+    model_io.save_model(model_io.model_path(filename), Q, count, 
+                        self.metadata)
+
+
+  def own_arrays(self):
+    pass
+
+
+class CanonicalRLAgent(CompactRLAgent):
+  """
+  Class of agent trained by Q-learning, storing its Q function only for 
+  representative states under the swaps of left and right hands of 
+  both players (225 states instead of 625, see tapnswap.CANONICAL). 
+  Symmetric positions and equivalent actions share their values and 
+  their visits. Replay buffers are not supported.
+  """
+
+  # Dense layout (RLAgent format) of Q and counter, for compatibility
+  @property
+  def Q(self):
+    return self.to_dense()[0]
+
+  @Q.setter
+  def Q(self, Q):
+    # Mean of equivalent entries
+    self.values = self.merge(np.asarray(Q)[LEGAL_ROWS, LEGAL_ACTIONS], 
+                    np.ones(len(LEGAL_ROWS)))[0].astype(self.q_dtype)
+
+  @property
+  def count_state_action(self):
+    return self.to_dense()[1]
+
+  @count_state_action.setter
+  def count_state_action(self, count):
+    counts = np.asarray(count)[LEGAL_ROWS, LEGAL_ACTIONS]
+    self.counts = self.merge(counts, counts)[1].astype(self.count_dtype)
+
+
+  def merge(self, q, weights):
+    """
+    Weighted means and sums of weights of equivalent entries.
+
+    Parameters
+    ----------
+    q, weights: np.arrays
+      Values and weights of possible actions in dense layout (in the 
+      order of LEGAL_ROWS, LEGAL_ACTIONS).
+
+    Return
+    ------
+    means, sums: np.arrays of shape (len(CANONICAL_STATES), 8).
+    """
+
+    shape = (len(CANONICAL_STATES), len(ACTIONS))
+    sums = np.zeros(shape)
+    totals = np.zeros(shape)
+    weights = weights.astype(np.float64)
+    np.add.at(sums, (CANONICAL_ROWS, CANONICAL_CODES), weights * q)
+    np.add.at(totals, (CANONICAL_ROWS, CANONICAL_CODES), weights)
+    means = np.divide(sums, totals, out = np.zeros(shape), 
+                      where = totals > 0)
+    return means, totals
+
+
+  def to_dense(self):
+    """
+    Q function and counter of state-action pairs in the dense layout 
+    of RLAgent (equivalent entries share their values and counts).
+
+    Return
+    ------
+    Q, count: np.arrays of shape (625, 8).
+    """
+
+    Q = np.zeros((N_STATES, len(ACTIONS)), dtype = self.q_dtype)
+    count = np.zeros((N_STATES, len(ACTIONS)), dtype = self.count_dtype)
+    Q[LEGAL_ROWS, LEGAL_ACTIONS] = self.values[CANONICAL_ROWS, 
+                                                CANONICAL_CODES]
+    count[LEGAL_ROWS, LEGAL_ACTIONS] = self.counts[CANONICAL_ROWS, 
+                                                    CANONICAL_CODES]
+    return Q, count
+
+
+  def from_dense(self, Q, count):
+    """
+    Set the Q function and the counter of state-action pairs from the 
+    dense layout of RLAgent: values of equivalent entries are averaged 
+    with their counts as weights and counts are summed.
+    """
+
+    counts = np.asarray(count)[LEGAL_ROWS, LEGAL_ACTIONS]
+    values, totals = self.merge(np.asarray(Q)[LEGAL_ROWS, LEGAL_ACTIONS], 
+                                counts)
+    self.values = values.astype(self.q_dtype)
+    self.counts = totals.astype(self.count_dtype)
+
+
+  def load_model(self, filename, load_rng = False, mmap_mode = None, 
+                  cache = True):
+    """
+    Same as RLAgent.load_model (see from_dense), except that the model 
+    can not be memory-mapped (mmap_mode must be None): the canonical 
+    layout always loads a private copy of the arrays.
+    """
+
+    assert mmap_mode is None, \
+    'The canonical layout can not memory-map a model.'
+
+    agent = RLAgent(rng = self.rng)
+    agent.load_model(filename, load_rng = load_rng, cache = cache)
+    self.from_dense(agent.Q, agent.count_state_action)
+    self.metadata = agent.metadata
+
+
+  def value(self, state):
+    """
+    Maximum value of Q at a packed state (0 for actions which are not 
+    representatives).
+    """
+
+    return float(self.values[_CANONICAL_INDEX[state]].max())
+
+
+  def choose_code(self, state, codes, greedy = False):
+    """
+    Same as RLAgent.choose_code.
+    """
+
+    epsilon = float(greedy) * self.epsilon
+
+    # Exploration
+    if epsilon > 0 and self.rng.random() <= epsilon:
+      return self.random_action(codes)
+
+    # Exploitation (first action of maximum value)
+    row = self.values[_CANONICAL_INDEX[state]]
+    actions = _CANONICAL_ACTION[state]
+    best_code = codes[0]
+    best = None
+    for code in codes:
+      action = actions[code]
+      q = row[action] if action >= 0 else 0.0
+      if best is None or q > best:
+        best = q
+        best_code = code
+    return best_code
+
+
+  def update_Q_code(self, state, code, reward, next_state):
+    """
+    Same as RLAgent.update_Q_code.
+    """
+
+    row = _CANONICAL_INDEX[state]
+    action = _CANONICAL_ACTION[state][code]
+    assert action >= 0, \
+    'The action {} at state {} is not possible.'.format(ACTIONS[code], 
+                                                        state)
+
+    # Compute Temporal Difference (TD)
+    delta_t = (reward + self.gamma * self.value(next_state) - 
+                float(self.values[row, action]))
+    # Update learning rate
+    if self.counts[row, action] < self.count_max:
+      self.counts[row, action] += 1
+    lr = 1.0/float( self.counts[row, action] )
+
+    #Update Q value
+    self.values[row, action] += lr * delta_t
+
+
+class PolicyAgent(Agent):
+  """
+  Class of agent playing a compiled policy: one action for each state, 
+  for instance the optimal decisions of a trained RL Agent 
+  (see RLAgent.compile_policy).
+  """
+
+  def __init__(self, policy = None, rng = None):
+    """
+    Parameters
+    ----------
+    policy: np.array of N_STATES int (or None)
+      Code of action for each packed state seen by the player who 
+      moves (see load_model otherwise).
+    rng: np.random.Generator, int, np.random.SeedSequence (or None)
+      Random generator of the agent (see Agent).
+    """
+
+    Agent.__init__(self, rng)
+    self.metadata = {}
+    if policy is not None:
+      self.set_policy(policy)
+
+
+  def set_policy(self, policy):
+    """
+    Set the table of actions (NumPy array for batches of states and 
+    list for single states).
+    """
+
+    self.policy = np.asarray(policy, dtype = np.int8)
+    self.codes = self.policy.tolist()
+
+
+  def load_model(self, filename, compile_model = True):
+    """
+    Load the policy stored at ./Models/filename.policy (see model_io).
+    If it does not exist, or if it was compiled from another version 
+    of the RL Agent model filename (hash of its files), the policy is 
+    compiled from this model (see RLAgent.load_model).
+
+    Parameters
+    ----------
+    filename: string
+      Name of the model.
+    compile_model: boolean
+      Set to False to forbid compiling the policy from the RL Agent 
+      model.
+    """
+
+    path = model_io.policy_path(filename)
+    model_hash = model_io.model_hash(filename) if compile_model else None
+    if os.path.exists(path):
+      policy, self.metadata = model_io.load_policy(path)
+      # Policy of current model (or without model)
+      if (model_hash is None or 
+          self.metadata.get('model_hash') == model_hash):
+        self.set_policy(policy)
+        return
+    assert compile_model, \
+    'The policy {} does not exist.'.format(path)
+
+    rl_agent = RLAgent()
+    rl_agent.load_model(filename)
+    self.metadata = {'model': filename, 'model_hash': model_hash}
+    self.set_policy(rl_agent.compile_policy())
+
+
+  def save_model(self, filename):
+    """
+    Save the policy at ./Models/filename.policy (see model_io).
+    """
+
+    model_io.save_policy(model_io.policy_path(filename), self.policy, 
+                          self.metadata)
+
+
+  def choose_action(self, raw_state, raw_actions, greedy = False):
+    """
+    Action of the policy at current state (raw_actions and greedy 
+    are not used: the action is always possible).
+    """
+
+    return ACTIONS[self.codes[pack_state(raw_state)]]
+
+
+  def choose_code(self, state, codes, greedy = False):
+    """
+    Same as choose_action with a packed state and codes of actions.
+    """
+
+    return self.codes[state]
+
+
+  def choose_codes(self, states):
+    """
+    Actions of the policy for a batch of states.
 
     Parameter
     ---------
-    filename : string
-      The path to Q matrix CSV file is ./Models/filename.csv 
-      while the counter of state-action pairs is located at 
-      ./Models/data/filename.csv.
+    states: np.array of int
+      Packed states seen by the players who move.
+
+    Return
+    ------
+    codes: np.array of int8
+      Codes of chosen actions.
+    """
+
+    return self.policy[states]
+
+
+  def is_deterministic(self, greedy = False):
+    """
+    Decisions only depend on the current state.
     """
 
-    # Load arrays as numpy arrays
-    self.Q = np.loadtxt('Models/' + filename + '.csv', delimiter=',')
-    self.count_state_action = np.loadtxt(
-      'Models/data/count_' + filename + '.csv', delimiter=',')
+    return True
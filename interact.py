@@ -8,6 +8,7 @@ Functions for interaction with the user on command line.
 # General Public License along with this program.  
 # If not, see <https://www.gnu.org/licenses/>.
 
+from tapnswap import ACTIONS, describe_action, unpack_state
 import time
 
 def tap_valid_digits(list_numbers):
@@ -111,24 +112,24 @@ def user_choose_action(tapnswap, player_idx):
 
   Parameters
   ----------
-  tapnswap: instance of TapnSwap.
+  tapnswap: instance of TableTapnSwap.
   player_idx: int (0 or 1)
     Index of player to choose action.
   """
   
   print('Choose an action')
   
-  # Print available actions
-  list_actions = tapnswap.list_actions_hu(player_idx)
-  for idx, action in enumerate(list_actions):
-    print(idx, ': ', action)
+  # Print available actions (text format is only built here)
+  state = tapnswap.mover_state(player_idx)
+  codes = tapnswap.legal_codes(player_idx)
+  for idx, code in enumerate(codes):
+    print(idx, ': ', describe_action(state, code))
   
   # Input action
-  action_idx = tap_valid_digits(range(len(list_actions)))
+  action_idx = tap_valid_digits(range(len(codes)))
 
   # Take action
-  actions = tapnswap.list_actions(player_idx)
-  tapnswap.take_action(player_idx, actions[action_idx])
+  tapnswap.step(player_idx, codes[action_idx])
 
 
 def check_game_over(tapnswap, names, player_idx):
@@ -173,7 +174,7 @@ def game_1vs1(tapnswap, player1, player2):
 
   Parameters
   ----------
-  tapnswap: instance of TapnSwap.
+  tapnswap: instance of TableTapnSwap.
   player1, player2: strings
     Names of the 2 players.
 
@@ -223,7 +224,7 @@ def game_1vsAgent(tapnswap, player, agent, greedy = False):
 
   Parameters
   ----------
-  tapnswap: instance of TapnSwap.
+  tapnswap: instance of TableTapnSwap.
   player: string
     Name of player.
   agent: instance of Agent to play against user.
@@ -271,26 +272,27 @@ def game_1vsAgent(tapnswap, player, agent, greedy = False):
       show_score(tapnswap, names, 1 - player_idx, invert = True)
       time.sleep(2)
 
-      # Get current state and possible actions
-      hands = tapnswap.show_hands().copy()
-      state = [ hands[player_idx], hands[1 - player_idx]  ]
-      actions = tapnswap.list_actions(player_idx)
+      # Get current state (seen by agent) and possible actions
+      state = tapnswap.mover_state(player_idx)
+      codes = tapnswap.legal_codes(player_idx)
       # Choose action
-      action = agent.choose_action(state, actions, greedy = greedy)
+      code = agent.choose_code(state, codes, greedy = greedy)
       # Take action
-      reward = tapnswap.take_action(player_idx, action)
+      next_state, _, reward, _ = tapnswap.step(player_idx, code)
 
       # Print chosen action
+      hands = unpack_state(state)
+      action = ACTIONS[code]
       seq = 'Computer '
       if action[0] == 0:
-        seq = seq + str('tapped with ' + str(hands[player_idx, action[1]]) + 
-                        ' on ' + str(hands[1 - player_idx, action[2]]) )
+        seq = seq + str('tapped with ' + str(hands[0, action[1]]) + 
+                        ' on ' + str(hands[1, action[2]]) )
       else:
-        new_hands = tapnswap.show_hands()
-        seq = seq + str( 'swapped ' + str(hands[player_idx][0]) + '-' + 
-                          str(hands[player_idx][1]) + ' for ' + 
-                          str(new_hands[player_idx][0]) + '-' + 
-                          str(new_hands[player_idx][1]) )
+        new_hands = unpack_state(next_state)
+        seq = seq + str( 'swapped ' + str(hands[0][0]) + '-' + 
+                          str(hands[0][1]) + ' for ' + 
+                          str(new_hands[0][0]) + '-' + 
+                          str(new_hands[0][1]) )
       print(seq)
       time.sleep(2)
 
@@ -8,9 +8,9 @@ Main script. Launches the navigation menu (rules, number of players, ...).
 # General Public License along with this program.  
 # If not, see <https://www.gnu.org/licenses/>.
 
-from tapnswap import TapnSwap
+from tapnswap import TableTapnSwap
 from interact import tap_valid_digits, game_1vs1, game_1vsAgent
-from agent import Agent, RandomAgent, RLAgent
+from agent import Agent, RandomAgent, PolicyAgent
 import os
 
 def clear_screen(): 
@@ -489,7 +489,7 @@ def game_mngr():
       scores = [0, 0]
 
       # Games
-      tapnswap = TapnSwap()
+      tapnswap = TableTapnSwap()
       over = False
       while not over: 
         game_over, winner = game_1vs1(tapnswap, player1, player2)
@@ -516,8 +516,8 @@ def game_mngr():
       elif int(level) == 1:
         agent = RandomAgent() # easy
       else:
-        # Load agent
-        agent = RLAgent()
+        # Load compiled policy of trained agent
+        agent = PolicyAgent()
         agent.load_model('greedy0_2_vsRandomvsSelf') # difficult
 
       # Ask player's name
@@ -527,7 +527,7 @@ def game_mngr():
       scores = [0, 0]
 
       # Games
-      tapnswap = TapnSwap()
+      tapnswap = TableTapnSwap()
       over = False
       while not over: 
         game_over, winner = game_1vsAgent(tapnswap, player, agent,
@@ -0,0 +1,396 @@
+"""
+TapnSwap game.
+Module MCTS defines an agent choosing its actions by Monte Carlo Tree
+Search (UCT). The search tree is kept from one action to the next one
+and random playouts are run by batches, in lockstep, with the
+transition tables of TapnSwap. The values of new nodes may be
+initialized with the Q-function of a trained RL Agent.
+"""
+
+# Copyright (C) 2020, Jean-Rémy Conti, ENS Paris-Saclay (France).
+# All rights reserved. You should have received a copy of the GNU
+# General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+from tapnswap import (NEXT_STATE, TERMINAL, WINNER, FLIP, LEGAL, ACTIONS,
+                      _NEXT_STATE, _TERMINAL, _FLIP, _LEGAL_CODES,
+                      pack_state, action_code)
+from agent import Agent, RLAgent, STATE_INDEX
+import numpy as np
+import math
+import sys
+import time
+
+
+class Node:
+  """
+  Node of the search tree. Its value is the sum of results of the
+  playouts through the node, for the player who moved to this node.
+  """
+
+  __slots__ = ('state', 'codes', 'children', 'visits', 'value',
+                'terminal')
+
+  def __init__(self, state, terminal = False):
+    """
+    Parameters
+    ----------
+    state: int
+      Packed state seen by the player who moves at this node.
+    terminal: boolean
+      Set to True if the game is over at this node.
+    """
+
+    self.state = state
+    self.terminal = terminal
+    self.codes = () if terminal else _LEGAL_CODES[state]
+    self.children = [None] * len(self.codes)
+    self.visits = 0
+    self.value = 0.0
+
+
+class MCTSAgent(Agent):
+  """
+  Class of agent choosing actions by Monte Carlo Tree Search.
+  """
+
+  def __init__(self, n_playouts = 2000, batch_size = 16,
+                time_limit = None, c_uct = 1.4, max_rollout = 100,
+                prior_model = None, prior_visits = 10, rng = None):
+    """
+    Parameters
+    ----------
+    n_playouts: int
+      Number of playouts for each action.
+    batch_size: int
+      Number of random playouts run in lockstep from each new node.
+    time_limit: float (or None)
+      Maximum time (in seconds) of search for each action.
+    c_uct: float
+      Exploration constant of UCT.
+    max_rollout: int
+      Maximum number of rounds of a random playout (tie beyond).
+    prior_model: string (or None)
+      Name of a trained RL Agent model (see RLAgent.load_model) whose
+      Q-function initializes the values of new nodes.
+    prior_visits: int
+      Number of fictive playouts given to the prior value.
+    rng: np.random.Generator, int (or None)
+      Generator (or seed) used for random playouts.
+    """
+
+    self.n_playouts = n_playouts
+    self.batch_size = batch_size
+    self.time_limit = time_limit
+    self.c_uct = c_uct
+    self.max_rollout = max_rollout
+    self.prior_visits = prior_visits
+    Agent.__init__(self, rng)
+
+    self.prior = None
+    if prior_model is not None:
+      rl_agent = RLAgent()
+      rl_agent.load_model(prior_model)
+      self.prior = rl_agent
+
+    self.root = None
+
+    # Statistics of last search and of all searches
+    self.stats = {'playouts': 0, 'time': 0.0, 'playouts_per_sec': 0.0,
+                  'nodes': 0, 'bytes_per_node': 0.0, 'reused': False}
+    self.total_playouts = 0
+    self.total_time = 0.0
+
+
+  def new_child(self, node, idx):
+    """
+    Create the child of node for its action of index idx.
+    """
+
+    state = node.state
+    code = node.codes[idx]
+    if _TERMINAL[state][code]:
+      child = Node(_NEXT_STATE[state][code], terminal = True)
+    else:
+      child = Node(_FLIP[_NEXT_STATE[state][code]])
+
+    # Prior value from Q-function (rewards are +/- 10)
+    if self.prior is not None:
+      q = self.prior.Q[STATE_INDEX[state], code]
+      child.visits = self.prior_visits
+      child.value = self.prior_visits * float(np.clip(q / 10.0, -1, 1))
+
+    node.children[idx] = child
+    return child
+
+
+  def rollouts(self, state):
+    """
+    Random playouts in lockstep from a position.
+
+    Parameter
+    ---------
+    state: int
+      Packed state seen by the player who moves.
+
+    Return
+    ------
+    total: float
+      Sum of results (1: win, -1: loss, 0: tie) of batch_size playouts
+      for the player who moves at state.
+    """
+
+    states = np.full(self.batch_size, state, dtype = np.int64)
+    active = np.ones(self.batch_size, dtype = bool)
+    total = 0.0
+    sign = 1.0
+    for _ in range(self.max_rollout):
+      mask = LEGAL[states]
+      codes = np.argmax(self.rng.random(mask.shape) * mask, axis = 1)
+      next_states = NEXT_STATE[states, codes]
+      over = active & TERMINAL[states, codes]
+      # Winner 0: the player who has just moved
+      wins = WINNER[states, codes] == 0
+      total += sign * (np.sum(over & wins) - np.sum(over & ~wins))
+      active = active & ~over
+      if not active.any():
+        break
+      states = np.where(active, FLIP[next_states], states)
+      sign = - sign
+    return total
+
+
+  def playout(self, root):
+    """
+    One iteration of MCTS: selection, expansion, batched random
+    playouts and backpropagation.
+
+    Parameter
+    ---------
+    root: Node.
+
+    Return
+    ------
+    n: int
+      Number of playouts done.
+    """
+
+    path = [root]
+    node = root
+    # Selection
+    while not node.terminal:
+      if None in node.children:
+        # Expansion
+        node = self.new_child(node, node.children.index(None))
+        path.append(node)
+        break
+      log_visits = math.log(node.visits)
+      best_score = - math.inf
+      for child in node.children:
+        score = (child.value / child.visits +
+                  self.c_uct * math.sqrt(log_visits / child.visits))
+        if score > best_score:
+          best_score = score
+          best = child
+      node = best
+      path.append(node)
+
+    # Results for the player who moves at last node (possible actions 
+    # never lose at once: the game is over because the other player won)
+    n = self.batch_size
+    if node.terminal:
+      total = - float(n)
+    else:
+      total = self.rollouts(node.state)
+
+    # Backpropagation (each value is for the player who moved to node)
+    for node in reversed(path):
+      node.visits += n
+      node.value -= total
+      total = - total
+    return n
+
+
+  def find_root(self, state):
+    """
+    Reuse the subtree of current state if it is in the tree (the root
+    was moved to the position of the opponent after previous search,
+    so that current state is one of its children), otherwise start a
+    new tree.
+    """
+
+    if self.root is not None and not self.root.terminal:
+      for child in self.root.children:
+        if (child is not None and not child.terminal
+            and child.state == state):
+          self.root = child
+          return True
+    self.root = Node(state)
+    return False
+
+
+  def count_nodes(self, node = None):
+    """
+    Number of nodes of the subtree of node (of the root if None).
+    """
+
+    if node is None:
+      node = self.root
+    count = 1
+    for child in node.children:
+      if child is not None:
+        count += self.count_nodes(child)
+    return count
+
+
+  def tree_bytes(self, node = None):
+    """
+    Memory (in bytes) of the subtree of node (of the root if None):
+    node objects and lists of children.
+    """
+
+    if node is None:
+      node = self.root
+    total = sys.getsizeof(node) + sys.getsizeof(node.children)
+    for child in node.children:
+      if child is not None:
+        total += self.tree_bytes(child)
+    return total
+
+
+  def bytes_per_node(self, node = None):
+    """
+    Average memory (in bytes) of a node of the subtree of node (of the
+    root if None): node object and list of children.
+    """
+
+    if node is None:
+      node = self.root
+    return self.tree_bytes(node) / self.count_nodes(node)
+
+
+  def search(self, state, codes):
+    """
+    Search from a position and move the root to the chosen action.
+
+    Parameters
+    ----------
+    state: int
+      Packed state seen by the player who moves.
+    codes: list of int
+      Codes of possible actions.
+
+    Return
+    ------
+    code: int
+      Code of most visited action among codes.
+    """
+
+    start = time.perf_counter()
+    reused = self.find_root(state)
+    root = self.root
+
+    n_playouts = 0
+    while n_playouts < self.n_playouts:
+      n_playouts += self.playout(root)
+      if (self.time_limit is not None and
+          time.perf_counter() - start > self.time_limit):
+        break
+
+    # Most visited action among possible ones
+    best_visits = -1
+    for idx, code in enumerate(root.codes):
+      child = root.children[idx]
+      if code in codes and child is not None and child.visits > best_visits:
+        best_visits = child.visits
+        best_idx = idx
+    if best_visits < 0:
+      best_code = codes[0]
+      self.root = None
+    else:
+      best_code = root.codes[best_idx]
+      self.root = root.children[best_idx]
+
+    # Statistics
+    elapsed = time.perf_counter() - start
+    self.stats = {'playouts': n_playouts, 'time': elapsed,
+                  'playouts_per_sec': n_playouts / max(elapsed, 1e-9),
+                  'nodes': self.count_nodes(root),
+                  'bytes_per_node': self.bytes_per_node(root),
+                  'reused': reused}
+    self.total_playouts += n_playouts
+    self.total_time += elapsed
+    return best_code
+
+
+  def playouts_per_sec(self):
+    """
+    Average number of playouts per second over all searches.
+    """
+
+    return self.total_playouts / max(self.total_time, 1e-9)
+
+
+  def choose_action(self, raw_state, raw_actions, greedy = False):
+    """
+    Choose the most visited action by MCTS at current state among a
+    list of possible actions (greedy is not used).
+
+    Parameters
+    ----------
+    raw_state: list
+      Current state in TapnSwap format.
+    raw_actions: list
+      List of possible current actions in TapnSwap format.
+    greedy: boolean
+      Not used.
+
+    Return
+    ------
+    raw_action: list
+      Action chosen by agent in TapnSwap format.
+    """
+
+    state = pack_state(raw_state)
+    codes = [action_code(action) for action in raw_actions]
+    return ACTIONS[self.search(state, codes)]
+
+
+  def choose_code(self, state, codes, greedy = False):
+    """
+    Same as choose_action with a packed state and codes of actions.
+    """
+
+    return self.search(state, codes)
+
+
+if __name__ == "__main__":
+
+  from agent import RandomAgent
+  from solver import SolvedAgent
+  from train import compare_agents
+  from tapnswap import START_STATE
+
+  # Tree reuse after a reply of the opponent
+  agent = MCTSAgent(n_playouts = 500)
+  code = agent.choose_code(START_STATE, _LEGAL_CODES[START_STATE])
+  opp_state = _FLIP[_NEXT_STATE[START_STATE][code]]
+  opp_code = [ code for code in _LEGAL_CODES[opp_state] 
+                if not _TERMINAL[opp_state][code] ][0]
+  state = _FLIP[_NEXT_STATE[opp_state][opp_code]]
+  agent.choose_code(state, _LEGAL_CODES[state])
+  assert agent.stats['reused'], 'The search tree was not reused.'
+
+  agent = MCTSAgent(n_playouts = 2000, batch_size = 16)
+  results = compare_agents(agent, RandomAgent(), n_games = 20,
+                            verbose = False)
+  print('Against Random Agent:', results)
+  print('{:.0f} playouts/sec, {} nodes in last tree, '
+        '{:.0f} bytes per node'.format(agent.playouts_per_sec(),
+        agent.stats['nodes'], agent.stats['bytes_per_node']))
+
+  agent = MCTSAgent(n_playouts = 2000, batch_size = 16,
+                    prior_model = 'greedy0_2_vsRandomvsSelf')
+  results = compare_agents(agent, SolvedAgent(), n_games = 10,
+                            time_limit = 100, verbose = False)
+  print('With Q prior, against Solved Agent:', results)
@@ -0,0 +1,496 @@
+"""
+TapnSwap game.
+Module Model_io reads and writes the trained models of RL Agents. A
+model is stored in one versioned binary file holding the Q-function,
+the counter of state-action pairs and metadata (epsilon, gamma, number
+of epochs, opponents, state of random generator). Arrays can be
+memory-mapped instead of being read. The former CSV format (Q-function
+and counter in 2 text files) is still supported for reading, and
+existing CSV models can be converted. Loaded models are kept in a
+process-wide cache shared by all agents.
+"""
+
+# Copyright (C) 2020, Jean-Rémy Conti, ENS Paris-Saclay (France).
+# All rights reserved. You should have received a copy of the GNU
+# General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+import numpy as np
+import struct
+import hashlib
+import json
+import os
+import re
+
+# Binary file: magic bytes, version (uint16), flags (uint16), length of
+# JSON header (uint32), JSON header, then arrays aligned on ALIGN bytes
+MAGIC = b'TNSQ'
+VERSION = 1
+PREFIX = struct.Struct('<4sHHI')
+ALIGN = 64
+EXTENSION = '.model'
+MODELS_DIR = 'Models'
+
+# Names of arrays in a model file
+ARRAYS = ('Q', 'count')
+
+# Policy file: magic bytes, then same prefix and JSON header as models,
+# then one action code (int8) per packed state
+POLICY_MAGIC = b'TNSP'
+POLICY_EXTENSION = '.policy'
+
+
+def model_path(filename, directory = MODELS_DIR):
+  """
+  Path to the binary file of a model -> ex: Models/filename.model.
+  """
+
+  return os.path.join(directory, filename + EXTENSION)
+
+
+def csv_paths(filename, directory = MODELS_DIR):
+  """
+  Paths to the CSV files (Q-function, counter) of a model in the
+  legacy format -> ex: Models/filename.csv, Models/data/count_filename.csv.
+  """
+
+  return (os.path.join(directory, filename + '.csv'),
+          os.path.join(directory, 'data', 'count_' + filename + '.csv'))
+
+
+def save_model(path, Q, count, metadata = None):
+  """
+  Save a model in a binary file.
+
+  Parameters
+  ----------
+  path: string
+    Path to binary file.
+  Q, count: np.arrays of same shape
+    Q-function and counter of state-action pairs.
+  metadata: dict (or None)
+    JSON-serializable information on the model.
+  """
+
+  arrays = {'Q': np.ascontiguousarray(Q),
+            'count': np.ascontiguousarray(count)}
+  if metadata is None:
+    metadata = {}
+
+  # Offsets of arrays depend on the length of header: increase them
+  # until the header fits before the first array
+  offset = ALIGN
+  while True:
+    header = {'metadata': metadata, 'arrays': {}}
+    position = offset
+    for name in ARRAYS:
+      array = arrays[name]
+      header['arrays'][name] = {'dtype': array.dtype.str,
+                                'shape': list(array.shape),
+                                'offset': position}
+      position += - (- array.nbytes // ALIGN) * ALIGN
+    data = json.dumps(header).encode('utf-8')
+    if PREFIX.size + len(data) <= offset:
+      break
+    offset += ALIGN
+
+  with open(path, 'wb') as f:
+    f.write(PREFIX.pack(MAGIC, VERSION, 0, len(data)))
+    f.write(data)
+    for name in ARRAYS:
+      f.seek(header['arrays'][name]['offset'])
+      f.write(arrays[name].tobytes())
+
+
+def read_header(path):
+  """
+  Read the header of a binary model file.
+
+  Parameter
+  ---------
+  path: string
+    Path to binary file.
+
+  Return
+  ------
+  header: dict
+    header['metadata']: metadata of the model.
+    header['arrays']: dtype, shape and offset of each array.
+  """
+
+  with open(path, 'rb') as f:
+    magic, version, _, length = PREFIX.unpack(f.read(PREFIX.size))
+    assert magic == MAGIC, \
+    'The file {} is not a TapnSwap model.'.format(path)
+    assert version <= VERSION, \
+    'The model {} has an unknown version {}.'.format(path, version)
+    return json.loads(f.read(length).decode('utf-8'))
+
+
+def load_model(path, mmap_mode = None):
+  """
+  Load a model saved by save_model.
+
+  Parameters
+  ----------
+  path: string
+    Path to binary file.
+  mmap_mode: None, 'r', 'r+' or 'c'
+    If not None, arrays are memory-mapped with this mode (see
+    np.memmap) instead of being read.
+
+  Return
+  ------
+  Q, count: np.arrays.
+  metadata: dict.
+  """
+
+  header = read_header(path)
+  arrays = []
+  for name in ARRAYS:
+    info = header['arrays'][name]
+    dtype = np.dtype(info['dtype'])
+    shape = tuple(info['shape'])
+    if mmap_mode is not None:
+      array = np.memmap(path, dtype = dtype, mode = mmap_mode,
+                        offset = info['offset'], shape = shape)
+    else:
+      with open(path, 'rb') as f:
+        f.seek(info['offset'])
+        array = np.fromfile(f, dtype = dtype,
+                            count = int(np.prod(shape))).reshape(shape)
+    arrays.append(array)
+  return arrays[0], arrays[1], header['metadata']
+
+
+def policy_path(filename, directory = MODELS_DIR):
+  """
+  Path to the policy file of a model -> ex: Models/filename.policy.
+  """
+
+  return os.path.join(directory, filename + POLICY_EXTENSION)
+
+
+def save_policy(path, policy, metadata = None):
+  """
+  Save a compiled policy (see agent.PolicyAgent) in a binary file.
+
+  Parameters
+  ----------
+  path: string
+    Path to binary file.
+  policy: np.array of int8
+    Code of action for each packed state (-1 if no action).
+  metadata: dict (or None)
+    JSON-serializable information on the policy.
+  """
+
+  if metadata is None:
+    metadata = {}
+  data = json.dumps({'metadata': metadata,
+                      'size': len(policy)}).encode('utf-8')
+  with open(path, 'wb') as f:
+    f.write(PREFIX.pack(POLICY_MAGIC, VERSION, 0, len(data)))
+    f.write(data)
+    f.write(np.asarray(policy, dtype = np.int8).tobytes())
+
+
+def load_policy(path):
+  """
+  Load a policy saved by save_policy.
+
+  Parameter
+  ---------
+  path: string
+    Path to binary file.
+
+  Return
+  ------
+  policy: np.array of int8.
+  metadata: dict.
+  """
+
+  with open(path, 'rb') as f:
+    magic, version, _, length = PREFIX.unpack(f.read(PREFIX.size))
+    assert magic == POLICY_MAGIC, \
+    'The file {} is not a TapnSwap policy.'.format(path)
+    assert version <= VERSION, \
+    'The policy {} has an unknown version {}.'.format(path, version)
+    header = json.loads(f.read(length).decode('utf-8'))
+    policy = np.frombuffer(f.read(header['size']), dtype = np.int8)
+  return policy, header['metadata']
+
+
+def metadata_from_name(filename):
+  """
+  Metadata of a model guessed from its name, for models named as
+  in validation.Optimizer -> ex: 'greedy0_2_vsRandomvsSelf' gives
+  epsilon 0.2 and opponents ['Random', 'Self'].
+  """
+
+  metadata = {}
+  match = re.match(r'greedy(\d)_(\d+)_vs(\w+?)(_temp)?$', filename)
+  if match is not None:
+    metadata['epsilon'] = float(match.group(1) + '.' + match.group(2))
+    metadata['opponents'] = re.findall('Random|Self', match.group(3))
+  return metadata
+
+
+def load_csv_model(filename, directory = MODELS_DIR):
+  """
+  Load a model in the legacy CSV format.
+
+  Parameters
+  ----------
+  filename: string
+    Name of the model (see csv_paths).
+  directory: string
+    Directory of models.
+
+  Return
+  ------
+  Q, count: np.arrays.
+  metadata: dict (guessed from name).
+  """
+
+  q_path, count_path = csv_paths(filename, directory)
+  Q = np.loadtxt(q_path, delimiter=',')
+  count = np.loadtxt(count_path, delimiter=',')
+  return Q, count, metadata_from_name(filename)
+
+
+def model_exists(filename, directory = MODELS_DIR):
+  """
+  Whether a model exists, in binary or CSV format.
+  """
+
+  return (os.path.exists(model_path(filename, directory)) or
+          os.path.exists(csv_paths(filename, directory)[0]))
+
+
+def model_files(filename, directory = MODELS_DIR):
+  """
+  Existing files of a model (binary and CSV formats).
+  """
+
+  paths = (model_path(filename, directory),) + csv_paths(filename, directory)
+  return [ path for path in paths if os.path.exists(path) ]
+
+
+def model_hash(filename, directory = MODELS_DIR):
+  """
+  SHA-256 digest of the contents of the existing files of a model 
+  (None if the model does not exist). Used to check that a compiled 
+  policy comes from the current version of its model.
+  """
+
+  paths = model_files(filename, directory)
+  if len(paths) == 0:
+    return None
+  digest = hashlib.sha256()
+  for path in paths:
+    with open(path, 'rb') as f:
+      digest.update(f.read())
+  return digest.hexdigest()
+
+
+def remove_model(filename, directory = MODELS_DIR):
+  """
+  Delete all files of a model.
+  """
+
+  for path in model_files(filename, directory):
+    os.remove(path)
+
+
+def rename_model(filename, new_filename, directory = MODELS_DIR):
+  """
+  Rename all files of a model (existing files of new_filename are
+  replaced). Each file is atomically replaced, so that a model read
+  by another process is never missing.
+  """
+
+  old_paths = (model_path(filename, directory),) + csv_paths(filename,
+                                                              directory)
+  new_paths = (model_path(new_filename, directory),) + csv_paths(
+                                                new_filename, directory)
+  for old_path, new_path in zip(old_paths, new_paths):
+    if os.path.exists(old_path):
+      os.replace(old_path, new_path)
+    elif os.path.exists(new_path):
+      # Stale file of new_filename in another format
+      os.remove(new_path)
+
+
+class ModelCache:
+  """
+  Cache of loaded models with Least Recently Used eviction under a
+  budget of bytes. An entry is reloaded if the files of the model
+  changed (modification time or size). Cached arrays are read-only:
+  they are shared between agents, which copy them before any update.
+  """
+
+  def __init__(self, max_bytes = 64 * 2**20, directory = MODELS_DIR):
+    """
+    Parameters
+    ----------
+    max_bytes: int
+      Maximum number of bytes of cached arrays.
+    directory: string
+      Directory of models.
+    """
+
+    self.max_bytes = max_bytes
+    self.directory = directory
+    # {filename: (signature of files, Q, count, metadata, n_bytes)}
+    self.entries = OrderedDict()
+    self.n_bytes = 0
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+
+  def signature(self, filename):
+    """
+    Modification times and sizes of the files of a model.
+    """
+
+    signature = []
+    for path in model_files(filename, self.directory):
+      stat = os.stat(path)
+      signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+  def load(self, filename):
+    """
+    Load a model (binary or CSV format) through the cache.
+
+    Parameter
+    ---------
+    filename: string
+      Name of the model.
+
+    Return
+    ------
+    Q, count: read-only np.arrays (shared with other agents).
+    metadata: dict (copy owned by the caller).
+    """
+
+    signature = self.signature(filename)
+    entry = self.entries.get(filename)
+    if entry is not None and entry[0] == signature:
+      self.hits += 1
+      self.entries.move_to_end(filename)
+    else:
+      self.misses += 1
+      self.discard(filename)
+      path = model_path(filename, self.directory)
+      if os.path.exists(path):
+        Q, count, metadata = load_model(path)
+      else:
+        Q, count, metadata = load_csv_model(filename, self.directory)
+      Q.flags.writeable = False
+      count.flags.writeable = False
+      entry = (signature, Q, count, metadata, Q.nbytes + count.nbytes)
+      self.entries[filename] = entry
+      self.n_bytes += entry[4]
+      # Evict least recently used models (but keep the new one)
+      while self.n_bytes > self.max_bytes and len(self.entries) > 1:
+        _, old_entry = self.entries.popitem(last = False)
+        self.n_bytes -= old_entry[4]
+        self.evictions += 1
+    return entry[1], entry[2], dict(entry[3])
+
+
+  def discard(self, filename):
+    """
+    Remove a model from the cache.
+    """
+
+    entry = self.entries.pop(filename, None)
+    if entry is not None:
+      self.n_bytes -= entry[4]
+
+
+  def clear(self):
+    """
+    Remove all models from the cache.
+    """
+
+    self.entries.clear()
+    self.n_bytes = 0
+
+
+  def stats(self):
+    """
+    Counters of the cache.
+
+    Return
+    ------
+    stats: dict
+      Numbers of hits, misses, evictions, cached models and bytes.
+    """
+
+    return {'hits': self.hits, 'misses': self.misses,
+            'evictions': self.evictions, 'models': len(self.entries),
+            'bytes': self.n_bytes}
+
+
+# Cache shared by all agents of the process
+MODEL_CACHE = ModelCache()
+
+
+def convert_models(directory = MODELS_DIR, remove_csv = False,
+                    verbose = True):
+  """
+  Convert all CSV models of a directory into binary models.
+
+  Parameters
+  ----------
+  directory: string
+    Directory of models (with counters in directory/data).
+  remove_csv: boolean
+    Set to True to delete CSV files once converted.
+  verbose: boolean
+    Set to True to print each conversion.
+
+  Return
+  ------
+  converted: list of string
+    Names of converted models.
+  """
+
+  converted = []
+  for name in sorted(os.listdir(directory)):
+    if not name.endswith('.csv'):
+      continue
+    filename = name[:-len('.csv')]
+    if not os.path.exists(csv_paths(filename, directory)[1]):
+      continue
+    Q, count, metadata = load_csv_model(filename, directory)
+    path = model_path(filename, directory)
+    save_model(path, Q, count, metadata)
+
+    # Check conversion before deleting anything
+    new_Q, new_count, _ = load_model(path)
+    assert np.array_equal(new_Q, Q) and np.array_equal(new_count, count), \
+    'Conversion of model {} failed.'.format(filename)
+    if remove_csv:
+      for csv_path in csv_paths(filename, directory):
+        os.remove(csv_path)
+    converted.append(filename)
+
+    if verbose:
+      size = sum(os.path.getsize(csv_path)
+                  for csv_path in csv_paths(filename, directory)
+                  if os.path.exists(csv_path))
+      print('{}: {} bytes'.format(filename, os.path.getsize(path)),
+            '(CSV: {} bytes)'.format(size) if size else '')
+  return converted
+
+
+if __name__ == "__main__":
+
+  convert_models()
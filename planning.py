@@ -0,0 +1,389 @@
+"""
+TapnSwap game.
+Module Planning computes the Q function of an RL Agent without playing
+any game: the dynamics of TapnSwap are known (see tapnswap tables), so
+that the Q function is obtained by value iteration (Bellman backups)
+over the states reachable from the starting position. The opponent
+either plays its best action (minimax backups, as in self-play) or a
+uniformly random action (expectation backups, as a Random Agent). The
+Q function is saved as a model of RLAgent.
+"""
+
+# Copyright (C) 2020, Jean-Rémy Conti, ENS Paris-Saclay (France).
+# All rights reserved. You should have received a copy of the GNU
+# General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+from tapnswap import (N_STATES, NEXT_STATE, REWARD, TERMINAL, FLIP,
+                      LEGAL_CODES)
+from agent import (RLAgent, REACHABLE, PAIR_PTR, PAIR_CODES, PAIR_STATES,
+                    PAIR_ROWS, N_PAIRS)
+import numpy as np
+import heapq
+import time
+
+
+def build_replies():
+  """
+  Replies of the opponent to each pair (state, action) of the compact
+  layout of RLAgent (see agent.PAIR_PTR), from the point of view of the
+  agent: replies of pair p are REPLY_PTR[p] to REPLY_PTR[p + 1] - 1
+  (none if the action of the agent ends the game).
+
+  Return
+  ------
+  replies: dictionary of np.arrays
+    * 'ptr': (N_PAIRS + 1,) int, first reply of each pair.
+    * 'reward': reward of the agent after the reply.
+    * 'next_state': packed state seen by the agent after the reply
+      (-1 if the reply ends the game).
+    * 'weight': probability of the reply for a Random Agent.
+  """
+
+  n_replies = np.zeros(N_PAIRS, dtype = np.int64)
+  rewards = []
+  next_states = []
+  weights = []
+  for pair, (state, code) in enumerate(zip(PAIR_STATES.tolist(),
+                                            PAIR_CODES.tolist())):
+    if TERMINAL[state, code]:
+      continue
+    # State seen by the opponent and its possible replies
+    opp_state = int(FLIP[NEXT_STATE[state, code]])
+    opp_codes = LEGAL_CODES[opp_state]
+    n_replies[pair] = len(opp_codes)
+    for opp_code in opp_codes:
+      rewards.append(- REWARD[opp_state, opp_code])
+      if TERMINAL[opp_state, opp_code]:
+        next_states.append(-1)
+      else:
+        next_states.append(int(FLIP[NEXT_STATE[opp_state, opp_code]]))
+      weights.append(1.0 / len(opp_codes))
+
+  return {'ptr': np.concatenate(([0], np.cumsum(n_replies))),
+          'reward': np.array(rewards),
+          'next_state': np.array(next_states, dtype = np.int64),
+          'weight': np.array(weights)}
+
+
+class Planner:
+  """
+  Value iteration of the Q function of an agent against a known
+  opponent. Q(s, a) is the value of the agent taking action a at state
+  s: the reward of the action if it ends the game, otherwise the reward
+  of the agent after the reply of the opponent plus gamma times the 
+  value (maximum of Q over possible actions) of the next state of the 
+  agent. RLAgent.update_Q_index takes the maximum over all actions, 
+  including never updated impossible actions (value 0): a training 
+  continued from a planned model raises to 0 the values of states whose
+  possible actions all have negative values.
+  """
+
+  def __init__(self, opponent = 'self', gamma = 0.9):
+    """
+    Parameters
+    ----------
+    opponent: 'self' or 'random'
+      Reply of the opponent: best action for the opponent (minimax
+      backup, as in training vs Self) or uniformly random action
+      among its possible actions (expectation backup, as in training
+      vs Random).
+    gamma: float (in [0,1])
+      Factor of significance of first actions over last ones (with
+      gamma < 1, faster wins and slower losses are preferred). With 
+      gamma = 1, every action keeping a won position has the value of 
+      a win, so that the agent may swap forever instead of winning.
+    """
+
+    assert opponent in ['self', 'random'], \
+    'Unknown opponent {}.'.format(opponent)
+
+    self.opponent = opponent
+    self.gamma = gamma
+
+    # Rewards of actions ending the game and replies of the opponent
+    self.terminal = TERMINAL[PAIR_STATES, PAIR_CODES]
+    self.terminal_reward = REWARD[PAIR_STATES, PAIR_CODES]
+    self.replies = build_replies()
+    # Pairs with replies (reduceat needs non empty segments)
+    self.replied = np.flatnonzero(~ self.terminal)
+    self.reply_ends = self.replies['next_state'] < 0
+    self.reply_states = np.where(self.reply_ends, 0,
+                                  self.replies['next_state'])
+
+    # Q function of pairs and value of each packed state
+    # (0 for states out of the layout and game over states)
+    self.q = np.zeros(N_PAIRS)
+    self.V = np.zeros(N_STATES)
+
+    # Statistics of last planning
+    self.stats = {'method': None, 'sweeps': 0, 'backups': 0,
+                  'residual': np.inf, 'converged': False, 'time': 0.0}
+
+
+  def backup_pairs(self, V):
+    """
+    Bellman backup of all pairs (state, action) for values V of states.
+
+    Parameter
+    ---------
+    V: np.array of N_STATES float
+      Value of each packed state seen by the agent.
+
+    Return
+    ------
+    q: np.array of N_PAIRS float.
+    """
+
+    replies = self.replies
+    reply_values = replies['reward'] + self.gamma * np.where(
+                            self.reply_ends, 0.0, V[self.reply_states])
+    q = self.terminal_reward.copy()
+    starts = replies['ptr'][self.replied]
+    if self.opponent == 'self':
+      # The opponent minimizes the value of the agent
+      q[self.replied] = np.minimum.reduceat(reply_values, starts)
+    else:
+      q[self.replied] = np.add.reduceat(replies['weight'] * reply_values,
+                                        starts)
+    return q
+
+
+  def state_values(self, q):
+    """
+    Value of each packed state: maximum of q over possible actions.
+    """
+
+    V = np.zeros(N_STATES)
+    V[REACHABLE] = np.maximum.reduceat(q, PAIR_PTR[REACHABLE])
+    return V
+
+
+  def synchronous(self, tol = 1e-9, max_sweeps = 10000):
+    """
+    Synchronous value iteration: every pair is backed up at each sweep
+    from the values of the previous sweep, until the largest change of
+    Q is lower than tol.
+
+    Parameters
+    ----------
+    tol: float
+      Convergence tolerance on Q.
+    max_sweeps: int
+      Maximum number of sweeps.
+    """
+
+    start = time.perf_counter()
+    residual = np.inf
+    sweeps = 0
+    while sweeps < max_sweeps and residual >= tol:
+      q = self.backup_pairs(self.V)
+      residual = float(np.abs(q - self.q).max())
+      self.q = q
+      self.V = self.state_values(q)
+      sweeps += 1
+
+    self.stats = {'method': 'synchronous', 'sweeps': sweeps,
+                  'backups': sweeps * N_PAIRS, 'residual': residual,
+                  'converged': residual < tol,
+                  'time': time.perf_counter() - start}
+
+
+  def prioritized(self, tol = 1e-9, max_sweeps = 10000):
+    """
+    Prioritized sweeping: states are backed up one at a time with the
+    current values, by decreasing change of value of their successors,
+    until no change is larger than tol.
+
+    Parameters
+    ----------
+    tol: float
+      Convergence tolerance on the values of states.
+    max_sweeps: int
+      Maximum number of backups, in number of states of the layout.
+    """
+
+    start = time.perf_counter()
+    replies = self.replies
+    reply_ptr = replies['ptr'].tolist()
+    reply_reward = replies['reward'].tolist()
+    reply_next = replies['next_state'].tolist()
+    reply_weight = replies['weight'].tolist()
+    terminal = self.terminal.tolist()
+    terminal_reward = self.terminal_reward.tolist()
+    pair_ptr = PAIR_PTR.tolist()
+    gamma = self.gamma
+    minimax = self.opponent == 'self'
+    q = self.q.tolist()
+    V = self.V.tolist()
+
+    # States whose value depends on the value of each state
+    predecessors = [ set() for _ in range(N_STATES) ]
+    for pair, state in enumerate(PAIR_STATES.tolist()):
+      for reply in range(reply_ptr[pair], reply_ptr[pair + 1]):
+        if reply_next[reply] >= 0:
+          predecessors[reply_next[reply]].add(state)
+
+    # Max-heap of states to back up (negative priorities), with the
+    # current priority of each state to skip outdated entries
+    priority = [0.0] * N_STATES
+    heap = []
+    for state in REACHABLE.tolist():
+      priority[state] = np.inf
+      heap.append((- np.inf, state))
+    heapq.heapify(heap)
+
+    max_backups = max_sweeps * len(REACHABLE)
+    backups = 0
+    while len(heap) > 0 and backups < max_backups:
+      neg_priority, state = heapq.heappop(heap)
+      if - neg_priority != priority[state]:
+        continue
+      priority[state] = 0.0
+
+      # Backup of the pairs of state
+      value = - np.inf
+      for pair in range(pair_ptr[state], pair_ptr[state + 1]):
+        if terminal[pair]:
+          q_pair = terminal_reward[pair]
+        else:
+          q_pair = np.inf if minimax else 0.0
+          for reply in range(reply_ptr[pair], reply_ptr[pair + 1]):
+            next_state = reply_next[reply]
+            reply_value = reply_reward[reply]
+            if next_state >= 0:
+              reply_value += gamma * V[next_state]
+            if minimax:
+              q_pair = min(q_pair, reply_value)
+            else:
+              q_pair += reply_weight[reply] * reply_value
+        q[pair] = q_pair
+        value = max(value, q_pair)
+      backups += pair_ptr[state + 1] - pair_ptr[state]
+
+      # Propagate the change of value to predecessors
+      change = abs(value - V[state])
+      V[state] = value
+      if change < tol:
+        continue
+      for parent in predecessors[state]:
+        if change > priority[parent]:
+          priority[parent] = change
+          heapq.heappush(heap, (- change, parent))
+
+    # Largest remaining change
+    residual = max([ priority[state] for state in REACHABLE.tolist() ] +
+                    [0.0])
+    self.q = np.array(q)
+    self.V = np.array(V)
+    self.stats = {'method': 'prioritized',
+                  'sweeps': backups / N_PAIRS, 'backups': backups,
+                  'residual': residual, 'converged': len(heap) == 0 or
+                                                      residual < tol,
+                  'time': time.perf_counter() - start}
+
+
+  def plan(self, method = 'synchronous', tol = 1e-9, max_sweeps = 10000):
+    """
+    Compute the Q function with method 'synchronous' or 'prioritized'
+    (see the corresponding methods).
+
+    Return
+    ------
+    stats: dictionary
+      Method, number of sweeps (in number of backups of all pairs for
+      prioritized sweeping), number of backups of pairs, last change
+      ('residual'), convergence and time (in seconds) of planning.
+    """
+
+    assert method in ['synchronous', 'prioritized'], \
+    'Unknown method {}.'.format(method)
+    getattr(self, method)(tol = tol, max_sweeps = max_sweeps)
+    return self.stats
+
+
+  def agent(self, q_dtype = np.float64, count_dtype = np.uint32):
+    """
+    RL Agent with the planned Q function (RLAgent format). Actions out
+    of the layout have value 0, as never updated actions. The counter
+    of each planned state-action pair is 1 (one exact backup).
+
+    Return
+    ------
+    agent: instance of RLAgent.
+    """
+
+    agent = RLAgent(epsilon = 0.0, gamma = self.gamma, q_dtype = q_dtype,
+                    count_dtype = count_dtype)
+    agent.Q[PAIR_ROWS, PAIR_CODES] = self.q
+    agent.count_state_action[PAIR_ROWS, PAIR_CODES] = 1
+    return agent
+
+
+def plan_model(filename, opponent = 'self', gamma = 0.9,
+                method = 'synchronous', tol = 1e-9, max_sweeps = 10000,
+                verbose = True):
+  """
+  Plan the Q function of an RL Agent (see Planner) and save it into a
+  binary model file, in the format read by RLAgent.load_model.
+
+  Parameters
+  ----------
+  filename: string
+    Name of the model. The path to the binary model file is then
+    ./Models/filename.model (see model_io).
+  opponent: 'self' or 'random'
+    Opponent of the agent (minimax or expectation backups).
+  gamma: float (in [0,1])
+    Factor of significance of first actions over last ones (lower 
+    than 1 to prefer faster wins, see Planner).
+  method: 'synchronous' or 'prioritized'
+    Order of Bellman backups.
+  tol: float
+    Convergence tolerance.
+  max_sweeps: int
+    Maximum number of sweeps.
+  verbose: boolean
+    Set to True to print the statistics of planning.
+
+  Return
+  ------
+  stats: dictionary (see Planner.plan).
+  """
+
+  planner = Planner(opponent = opponent, gamma = gamma)
+  stats = planner.plan(method = method, tol = tol, max_sweeps = max_sweeps)
+  if verbose:
+    print('Planning vs {} ({}): {:.4g} sweeps, {} backups, residual {:.3g}, '
+          '{:.3f} s'.format(opponent.capitalize(), method, stats['sweeps'],
+                            stats['backups'], stats['residual'],
+                            stats['time']))
+    if not stats['converged']:
+      print('Warning: planning did not converge.')
+
+  # Same metadata as models trained by train.train, without epochs
+  agent = planner.agent()
+  agent.save_model(filename, metadata = {
+    'epochs': 0, 'opponents': ['Random' if opponent == 'random'
+                                else 'Self'],
+    'planning': dict(stats, opponent = opponent, tol = tol)})
+  return stats
+
+
+if __name__ == "__main__":
+
+  from agent import RandomAgent
+  from solver import SolvedAgent
+  from train import compare_agents
+
+  for opponent in ['random', 'self']:
+    for method in ['synchronous', 'prioritized']:
+      plan_model('planned_0_9_vs' + opponent.capitalize(),
+                  opponent = opponent, gamma = 0.9, method = method)
+
+    agent = RLAgent()
+    agent.load_model('planned_0_9_vs' + opponent.capitalize())
+    print('Against Random Agent:', compare_agents(agent, RandomAgent(),
+                                  n_games = 10000, verbose = False))
+    print('Against Solved Agent:', compare_agents(agent, SolvedAgent(),
+                                  n_games = 100, verbose = False))
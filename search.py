@@ -0,0 +1,372 @@
+"""
+TapnSwap game.
+Module Search defines an agent choosing its actions by iterative
+deepening alpha-beta search (negamax) over TapnSwap positions, with a
+transposition table and detection of repeated positions (swap loops).
+Each search is limited by a time or node budget and reports the
+number of searched nodes per second.
+"""
+
+# Copyright (C) 2020, Jean-Rémy Conti, ENS Paris-Saclay (France).
+# All rights reserved. You should have received a copy of the GNU
+# General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+from tapnswap import (_NEXT_STATE, _TERMINAL, _WINNER, _FLIP, _LEGAL_CODES,
+                      ACTIONS, pack_state, action_code)
+from agent import Agent
+import time
+
+# Score of a won position (minus the number of rounds to win)
+WIN_SCORE = 1000
+
+# Flags of transposition table entries
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+class _OutOfBudget(Exception):
+  """
+  Raised to stop a search when its budget is spent.
+  """
+  pass
+
+
+class AlphaBetaAgent(Agent):
+  """
+  Class of agent choosing actions by alpha-beta search.
+  """
+
+  def __init__(self, time_limit = 0.1, max_nodes = None, max_depth = 64,
+                                                    tt_size = 4096):
+    """
+    Parameters
+    ----------
+    time_limit: float (or None)
+      Maximum time (in seconds) of search for each action.
+    max_nodes: int (or None)
+      Maximum number of searched nodes for each action. Searches
+      limited by max_nodes only are deterministic.
+    max_depth: int
+      Maximum depth (in rounds) of iterative deepening.
+    tt_size: int (power of 2)
+      Number of entries of the transposition table.
+    """
+
+    assert time_limit is not None or max_nodes is not None, \
+    'Please give a time or node budget.'
+    assert tt_size & (tt_size - 1) == 0, \
+    'The size of the transposition table must be a power of 2.'
+
+    Agent.__init__(self)
+    self.time_limit = time_limit
+    self.max_nodes = max_nodes
+    self.max_depth = max_depth
+
+    # Transposition table: one entry per slot, replaced if the new
+    # entry comes from a deeper search, from a newer search or from
+    # the same position
+    self.tt_mask = tt_size - 1
+    self.tt_key = [-1] * tt_size
+    self.tt_depth = [0] * tt_size
+    self.tt_value = [0] * tt_size
+    self.tt_flag = [EXACT] * tt_size
+    self.tt_code = [-1] * tt_size
+    self.tt_age = [0] * tt_size
+    self.age = 0
+
+    # Positions from the root to the current node (make/unmake stack)
+    self.path = []
+
+    # Statistics of last search and of all searches
+    self.stats = {'nodes': 0, 'time': 0.0, 'depth': 0, 'score': 0,
+                  'nodes_per_sec': 0.0}
+    self.total_nodes = 0
+    self.total_time = 0.0
+
+
+  def evaluate(self, state):
+    """
+    Heuristic score of a position for the player who moves: difference
+    between the numbers of living hands.
+
+    Parameter
+    ---------
+    state: int
+      Packed state seen by the player who moves.
+
+    Return
+    ------
+    score: int.
+    """
+
+    alive = (int(state // 125 > 0) + int(state // 25 % 5 > 0) -
+              int(state // 5 % 5 > 0) - int(state % 5 > 0))
+    return 10 * alive
+
+
+  def tt_index(self, state):
+    """
+    Slot of a position in the transposition table.
+    """
+
+    return (state * 2654435761) & self.tt_mask
+
+
+  def tt_store(self, state, depth, value, flag, code, ply):
+    """
+    Store a search result in the transposition table. Win scores are
+    stored relatively to the position (not to the root).
+    """
+
+    idx = self.tt_index(state)
+    if (self.tt_key[idx] == state or self.tt_age[idx] != self.age
+        or depth >= self.tt_depth[idx]):
+      if value > WIN_SCORE // 2:
+        value += ply
+      elif value < - WIN_SCORE // 2:
+        value -= ply
+      self.tt_key[idx] = state
+      self.tt_depth[idx] = depth
+      self.tt_value[idx] = value
+      self.tt_flag[idx] = flag
+      self.tt_code[idx] = code
+      self.tt_age[idx] = self.age
+
+
+  def negamax(self, state, depth, alpha, beta, ply):
+    """
+    Alpha-beta search of a position.
+
+    Parameters
+    ----------
+    state: int
+      Packed state seen by the player who moves.
+    depth: int
+      Remaining depth (in rounds).
+    alpha, beta: int
+      Search window.
+    ply: int
+      Number of rounds from the root.
+
+    Return
+    ------
+    score: int
+      Score of the position for the player who moves.
+    """
+
+    # Budget
+    self.nodes += 1
+    if self.max_nodes is not None and self.nodes > self.max_nodes:
+      raise _OutOfBudget
+    if (self.deadline is not None and (self.nodes & 255) == 0
+        and time.perf_counter() > self.deadline):
+      raise _OutOfBudget
+
+    # Transposition table
+    idx = self.tt_index(state)
+    tt_code = -1
+    if self.tt_key[idx] == state:
+      tt_code = self.tt_code[idx]
+      if self.tt_depth[idx] >= depth:
+        value = self.tt_value[idx]
+        if value > WIN_SCORE // 2:
+          value -= ply
+        elif value < - WIN_SCORE // 2:
+          value += ply
+        flag = self.tt_flag[idx]
+        if flag == EXACT:
+          return value
+        if flag == LOWER and value >= beta:
+          return value
+        if flag == UPPER and value <= alpha:
+          return value
+
+    if depth == 0:
+      return self.evaluate(state)
+
+    # Move ordering: best move of transposition table first
+    codes = _LEGAL_CODES[state]
+    if tt_code in codes:
+      codes = (tt_code,) + tuple(code for code in codes if code != tt_code)
+
+    alpha_orig = alpha
+    best_score = - WIN_SCORE - 1
+    best_code = -1
+    for code in codes:
+      if _TERMINAL[state][code]:
+        score = WIN_SCORE - ply - 1
+        if _WINNER[state][code] != 0:
+          score = - score
+      else:
+        child = _FLIP[_NEXT_STATE[state][code]]
+        # Repetition: same position with same player to move
+        if child in self.path[-2::-2]:
+          score = 0
+        else:
+          # Make / unmake move
+          self.path.append(child)
+          try:
+            score = - self.negamax(child, depth - 1, - beta, - alpha,
+                                                              ply + 1)
+          finally:
+            self.path.pop()
+      if score > best_score:
+        best_score = score
+        best_code = code
+      if score > alpha:
+        alpha = score
+      if alpha >= beta:
+        break
+
+    if best_score <= alpha_orig:
+      flag = UPPER
+    elif best_score >= beta:
+      flag = LOWER
+    else:
+      flag = EXACT
+    self.tt_store(state, depth, best_score, flag, best_code, ply)
+    return best_score
+
+
+  def search(self, state, codes):
+    """
+    Iterative deepening search of a position.
+
+    Parameters
+    ----------
+    state: int
+      Packed state seen by the player who moves.
+    codes: list of int
+      Codes of possible actions.
+
+    Return
+    ------
+    code: int
+      Code of best action found.
+    """
+
+    start = time.perf_counter()
+    self.deadline = None
+    if self.time_limit is not None:
+      self.deadline = start + self.time_limit
+    self.nodes = 0
+    self.age += 1
+    self.path = [state]
+
+    best_code = codes[0]
+    best_score = 0
+    depth_done = 0
+    for depth in range(1, self.max_depth + 1):
+      # Best action of previous iteration first
+      ordered = [best_code] + [code for code in codes if code != best_code]
+      alpha = - WIN_SCORE - 1
+      iter_code = best_code
+      try:
+        for code in ordered:
+          if _TERMINAL[state][code]:
+            score = WIN_SCORE - 1
+            if _WINNER[state][code] != 0:
+              score = - score
+          else:
+            child = _FLIP[_NEXT_STATE[state][code]]
+            self.path.append(child)
+            try:
+              score = - self.negamax(child, depth - 1, - WIN_SCORE - 1,
+                                      - alpha, 1)
+            finally:
+              self.path.pop()
+          if score > alpha:
+            alpha = score
+            iter_code = code
+      except _OutOfBudget:
+        break
+      best_code = iter_code
+      best_score = alpha
+      depth_done = depth
+      # Forced result found
+      if abs(best_score) > WIN_SCORE // 2:
+        break
+
+    # Statistics
+    elapsed = time.perf_counter() - start
+    self.stats = {'nodes': self.nodes, 'time': elapsed,
+                  'depth': depth_done, 'score': best_score,
+                  'nodes_per_sec': self.nodes / max(elapsed, 1e-9)}
+    self.total_nodes += self.nodes
+    self.total_time += elapsed
+    return best_code
+
+
+  def nodes_per_sec(self):
+    """
+    Average number of searched nodes per second over all searches.
+    """
+
+    return self.total_nodes / max(self.total_time, 1e-9)
+
+
+  def choose_action(self, raw_state, raw_actions, greedy = False):
+    """
+    Choose the best action found by search at current state among a
+    list of possible actions (greedy is not used).
+
+    Parameters
+    ----------
+    raw_state: list
+      Current state in TapnSwap format.
+    raw_actions: list
+      List of possible current actions in TapnSwap format.
+    greedy: boolean
+      Not used.
+
+    Return
+    ------
+    raw_action: list
+      Action chosen by agent in TapnSwap format.
+    """
+
+    state = pack_state(raw_state)
+    codes = [action_code(action) for action in raw_actions]
+    return ACTIONS[self.search(state, codes)]
+
+
+  def choose_code(self, state, codes, greedy = False):
+    """
+    Same as choose_action with a packed state and codes of actions.
+    """
+
+    return self.search(state, list(codes))
+
+
+if __name__ == "__main__":
+
+  from agent import RandomAgent, RLAgent
+  from train import compare_agents
+  from tapnswap import START_STATE, LEGAL_CODES, unpack_state
+
+  # Latency of search compared with Q-table lookups
+  agent = AlphaBetaAgent(time_limit = 0.05)
+  rl_agent = RLAgent()
+  rl_agent.load_model('greedy0_2_vsRandomvsSelf')
+  hands = unpack_state(START_STATE)
+  raw_state = [hands[0], hands[1]]
+  raw_actions = [ACTIONS[code] for code in LEGAL_CODES[START_STATE]]
+
+  start = time.perf_counter()
+  agent.choose_action(raw_state, raw_actions)
+  print('Alpha-beta: {} nodes, depth {}, {:.0f} nodes/sec, {:.2f} ms'.format(
+        agent.stats['nodes'], agent.stats['depth'],
+        agent.stats['nodes_per_sec'], 1000 * agent.stats['time']))
+
+  n_calls = 1000
+  start = time.perf_counter()
+  for _ in range(n_calls):
+    rl_agent.choose_action(raw_state, raw_actions)
+  print('Q-table: {:.3f} ms per action'.format(
+        1000 * (time.perf_counter() - start) / n_calls))
+
+  results = compare_agents(agent, RandomAgent(), n_games = 100,
+                            verbose = False)
+  print('Against Random Agent:', results)
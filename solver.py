@@ -0,0 +1,332 @@
+"""
+TapnSwap game.
+Module Solver labels every position of TapnSwap as a win, a loss or a
+draw (by repetition) for the player who moves, with the number of
+rounds before the end of the game under optimal play. It is done by
+retrograde analysis over the complete game graph. The solution can be
+saved in a compact binary file, probed in O(1) and used by a perfect
+agent (SolvedAgent).
+"""
+
+# Copyright (C) 2020, Jean-Rémy Conti, ENS Paris-Saclay (France).
+# All rights reserved. You should have received a copy of the GNU
+# General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+from tapnswap import (N_STATES, START_STATE, NEXT_STATE, TERMINAL, WINNER,
+                      FLIP, GAME_OVER, STATE_WINNER, LEGAL_CODES, ACTIONS,
+                      pack_state, action_code)
+from agent import Agent
+import numpy as np
+import os
+
+# Values of positions for the player who moves
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+# Binary file: magic bytes, then N_STATES values (int8),
+# then N_STATES distances (uint16, little-endian)
+MAGIC = b'TNS\x01'
+SOLUTION_PATH = 'Models/solution.bin'
+
+
+def solve():
+  """
+  Retrograde analysis of TapnSwap. Positions are packed states seen by
+  the player who moves, so that the 625 states cover both movers.
+  Only unique possible actions (TapnSwap.list_actions) are considered.
+
+  Return
+  ------
+  value: np.array of N_STATES int8
+    WIN, LOSS or DRAW for the player who moves.
+  dist: np.array of N_STATES uint16
+    Number of rounds before the end of the game if both players play
+    optimally (fastest win, slowest loss). 0 for game over states and
+    for draws.
+  """
+
+  value = np.zeros(N_STATES, dtype = np.int8)
+  dist = np.zeros(N_STATES, dtype = np.uint16)
+  solved = np.zeros(N_STATES, dtype = bool)
+
+  # Game over states: nobody moves anymore
+  for state in np.flatnonzero(GAME_OVER):
+    value[state] = WIN if STATE_WINNER[state] == 0 else LOSS
+    solved[state] = True
+
+  # Predecessors of each position and number of moves of each position
+  # which are not known to lead to a win of the opponent
+  parents = [[] for _ in range(N_STATES)]
+  remaining = np.zeros(N_STATES, dtype = np.int64)
+  # buckets[d]: positions solved with distance d
+  buckets = [[], []]
+
+  for state in range(N_STATES):
+    if solved[state]:
+      continue
+    for code in LEGAL_CODES[state]:
+      if TERMINAL[state, code]:
+        if WINNER[state, code] == 0:
+          # Immediate win
+          value[state] = WIN
+          dist[state] = 1
+          solved[state] = True
+        continue
+      child = FLIP[NEXT_STATE[state, code]]
+      parents[child].append(state)
+      remaining[state] += 1
+    if solved[state]:
+      buckets[1].append(state)
+    elif remaining[state] == 0:
+      # All moves lose immediately
+      value[state] = LOSS
+      dist[state] = 1
+      solved[state] = True
+      buckets[1].append(state)
+
+  # Propagate solved positions to predecessors, by increasing distance
+  d = 1
+  while len(buckets[d]) > 0:
+    buckets.append([])
+    for child in buckets[d]:
+      for parent in parents[child]:
+        if solved[parent]:
+          continue
+        if value[child] == LOSS:
+          # Move to a lost position for the opponent
+          value[parent] = WIN
+        else:
+          remaining[parent] -= 1
+          if remaining[parent] > 0:
+            continue
+          # All moves lead to won positions for the opponent
+          value[parent] = LOSS
+        dist[parent] = d + 1
+        solved[parent] = True
+        buckets[d + 1].append(parent)
+    d += 1
+
+  # Unsolved positions are draws by repetition
+  return value, dist
+
+
+def save_solution(value, dist, filename = SOLUTION_PATH):
+  """
+  Save the solution in a compact binary file.
+
+  Parameters
+  ----------
+  value, dist: np.arrays
+    Output of solve.
+  filename: string
+    Path to binary file.
+  """
+
+  with open(filename, 'wb') as f:
+    f.write(MAGIC)
+    f.write(value.astype(np.int8).tobytes())
+    f.write(dist.astype('<u2').tobytes())
+
+
+def load_solution(filename = SOLUTION_PATH):
+  """
+  Load a solution saved by save_solution.
+
+  Parameter
+  ---------
+  filename: string
+    Path to binary file.
+
+  Return
+  ------
+  value, dist: np.arrays (same format than the output of solve).
+  """
+
+  with open(filename, 'rb') as f:
+    data = f.read()
+  assert data[:len(MAGIC)] == MAGIC, \
+  'The file {} is not a TapnSwap solution.'.format(filename)
+  start = len(MAGIC)
+  value = np.frombuffer(data, dtype = np.int8, count = N_STATES,
+                        offset = start)
+  dist = np.frombuffer(data, dtype = '<u2', count = N_STATES,
+                        offset = start + N_STATES)
+  return value, dist
+
+
+class Solution:
+  """
+  Solved TapnSwap, probed in O(1).
+  """
+
+  def __init__(self, filename = SOLUTION_PATH):
+    """
+    Load the solution from filename, or solve the game (and save the
+    solution) if the file does not exist.
+
+    Parameter
+    ---------
+    filename: string (or None)
+      Path to binary file. If None, the game is solved without saving.
+    """
+
+    if filename is not None and os.path.exists(filename):
+      value, dist = load_solution(filename)
+    else:
+      value, dist = solve()
+      if filename is not None:
+        save_solution(value, dist, filename)
+    # Python lists for scalar lookups
+    self.value = value.tolist()
+    self.dist = dist.tolist()
+
+
+  def probe(self, state):
+    """
+    Value of a position for the player who moves.
+
+    Parameter
+    ---------
+    state: int
+      Packed state seen by the player who moves.
+
+    Return
+    ------
+    value: int (WIN, DRAW or LOSS).
+    dist: int
+      Number of rounds before the end of the game under optimal play.
+    """
+
+    return self.value[state], self.dist[state]
+
+
+  def evaluate(self, state, code):
+    """
+    Value of an action for the player who takes it.
+
+    Parameters
+    ----------
+    state: int
+      Packed state seen by the player who moves.
+    code: int
+      Code of action (index in ACTIONS).
+
+    Return
+    ------
+    value: int (WIN, DRAW or LOSS).
+    dist: int
+      Number of rounds before the end of the game under optimal play,
+      counting this action.
+    """
+
+    if TERMINAL[state, code]:
+      return (WIN if WINNER[state, code] == 0 else LOSS), 1
+    child = int(FLIP[NEXT_STATE[state, code]])
+    return - self.value[child], self.dist[child] + 1
+
+
+  def best_code(self, state, codes):
+    """
+    Best action among codes: fastest win, else draw, else slowest loss.
+    Ties are broken by the order of codes.
+
+    Parameters
+    ----------
+    state: int
+      Packed state seen by the player who moves.
+    codes: list of int
+      Codes of possible actions.
+
+    Return
+    ------
+    code: int
+      Code of best action.
+    """
+
+    best_key = None
+    best = None
+    for code in codes:
+      value, dist = self.evaluate(state, code)
+      key = (value, - dist if value == WIN else dist)
+      if best_key is None or key > best_key:
+        best_key = key
+        best = code
+    return best
+
+
+class SolvedAgent(Agent):
+  """
+  Class of perfect agent, playing with the solution of the game.
+  """
+
+  def __init__(self, filename = SOLUTION_PATH):
+    """
+    Load (or compute) the solution of the game.
+
+    Parameter
+    ---------
+    filename: string (or None)
+      Path to binary file of the solution (see Solution).
+    """
+
+    Agent.__init__(self)
+    self.solution = Solution(filename)
+
+
+  def choose_action(self, raw_state, raw_actions, greedy = False):
+    """
+    Choose the best action at current state among a list of possible
+    actions (greedy is not used: decisions are always optimal).
+
+    Parameters
+    ----------
+    raw_state: list
+      Current state in TapnSwap format.
+    raw_actions: list
+      List of possible current actions in TapnSwap format.
+    greedy: boolean
+      Not used.
+
+    Return
+    ------
+    raw_action: list
+      Action chosen by agent in TapnSwap format.
+    """
+
+    state = pack_state(raw_state)
+    codes = [action_code(action) for action in raw_actions]
+    return ACTIONS[self.solution.best_code(state, codes)]
+
+
+  def choose_code(self, state, codes, greedy = False):
+    """
+    Same as choose_action with a packed state and codes of actions.
+    """
+
+    return self.solution.best_code(state, codes)
+
+
+  def is_deterministic(self, greedy = False):
+    """
+    Decisions only depend on the current state.
+    """
+
+    return True
+
+
+if __name__ == "__main__":
+
+  value, dist = solve()
+  save_solution(value, dist)
+
+  playable = ~ GAME_OVER
+  print('Positions (player to move):', int(playable.sum()))
+  print('Wins:  ', int((value[playable] == WIN).sum()))
+  print('Losses:', int((value[playable] == LOSS).sum()))
+  print('Draws: ', int((value[playable] == DRAW).sum()))
+  print('Starting position:',
+        {WIN: 'win', LOSS: 'loss', DRAW: 'draw'}[int(value[START_STATE])],
+        'in', int(dist[START_STATE]), 'rounds')
+  print('Solution saved in', SOLUTION_PATH)
@@ -17,6 +17,8 @@ class TapnSwap:
     their possible actions.
     """
 
+    __slots__ = ('hands',)
+
     def __init__(self):
         """
         Initialize 4 hands (2 for each player).
@@ -258,23 +260,24 @@ class TapnSwap:
 
         # List of non-unique actions
         actions = self.list_actions_tap(pair0) + self.list_actions_swap(pair0)
-        
-        # Corresponding actions in text format
-        actions_h = self.list_actions_h(pair0)    # non-uniques
-        actions_hu = self.list_actions_hu(pair0)  # uniques
 
-        # Keep unique actions
-        indices_to_del = []
-        if len(actions_hu) != len(actions_h):
-          for action in range(len(actions_hu)):
-            indices = [i for i, x in enumerate(actions_h) 
-                        if x == actions_hu[action]]
-            if len(indices) > 1:
-              indices_to_del += indices[1:]
-        actions = [action for idx, action in enumerate(actions) 
-                    if idx not in indices_to_del]
+        # Keep unique actions: 2 actions are identical if they have the 
+        # same text format (see list_actions_h), i.e. if they tap with 
+        # the same fingers on the same fingers or swap for the same hands
+        seen = set()
+        unique_actions = []
+        for action in actions:
+          if action[0] == 0:
+            key = (0, self.hands[pair0, action[1]], 
+                    self.hands[1 - pair0, action[2]])
+          else:
+            key = (1, self.hands[pair0, action[1]] - action[2], 
+                    self.hands[pair0, 1 - action[1]] + action[2])
+          if key not in seen:
+            seen.add(key)
+            unique_actions.append(action)
 
-        return actions
+        return unique_actions
 
 
     def show_hands(self):
@@ -350,3 +353,737 @@ class TapnSwap:
 
         self.hands = np.array([[1, 1], [1, 1]])
 
+
+
+# ---------------------------------------------------------------------
+# Table-driven engine
+# ---------------------------------------------------------------------
+# A state is packed in base 5 as the 4 finger counts
+# [ [hand0_p0, hand1_p0], [hand0_p1, hand1_p1] ]
+# -> ((hand0_p0 * 5 + hand1_p0) * 5 + hand0_p1) * 5 + hand1_p1.
+# Transition tables are indexed by states seen from the point of view 
+# of the player who moves (pair 0 = mover, pair 1 = opponent).
+
+N_STATES = 5**4
+
+# Actions in TapnSwap format, indexed by their integer code
+# (same ordering as the action coder of RLAgent)
+ACTIONS = [ [0, i, j] for i in range(2) for j in range(2) ] + \
+          [ [1, i, j] for i in range(2) for j in range(1,3) ]
+N_ACTIONS = len(ACTIONS)
+
+# Packed starting state [[1,1], [1,1]]
+START_STATE = 156
+
+
+def pack_state(hands):
+  """
+  Pack hands into a single integer.
+
+  Parameter
+  ---------
+  hands: array or list
+    Hands in TapnSwap format -> ex: [ [1,2], [3,4] ].
+
+  Return
+  ------
+  state: int (in [0, 624])
+    Packed state.
+  """
+
+  return int(((hands[0][0] * 5 + hands[0][1]) * 5 + 
+              hands[1][0]) * 5 + hands[1][1])
+
+
+def unpack_state(state):
+  """
+  Unpack an integer state into hands in TapnSwap format.
+
+  Parameter
+  ---------
+  state: int (in [0, 624])
+    Packed state.
+
+  Return
+  ------
+  hands: np.array of shape (2,2)
+    Hands in TapnSwap format.
+  """
+
+  return np.array([[state // 125, state // 25 % 5], 
+                    [state // 5 % 5, state % 5]])
+
+
+def action_code(action):
+  """
+  Integer code of an action in TapnSwap format -> ex: [1,0,2] gives 5.
+
+  Parameter
+  ---------
+  action: list
+    Action in TapnSwap format.
+
+  Return
+  ------
+  code: int (in [0, 7])
+    Index of action in ACTIONS.
+  """
+
+  return 4 * action[0] + 2 * action[1] + action[2] - action[0]
+
+
+def build_tables():
+  """
+  Enumerate all (state, action) pairs with the reference engine 
+  TapnSwap. States are seen from the mover's point of view (pair 0).
+
+  Return
+  ------
+  tables: dictionary of np.arrays
+    * 'next_state': (N_STATES, N_ACTIONS) int, packed next state 
+      (-1 if the action is not valid).
+    * 'reward': (N_STATES, N_ACTIONS) float, reward of the mover.
+    * 'terminal': (N_STATES, N_ACTIONS) bool, game over after action.
+    * 'winner': (N_STATES, N_ACTIONS) int, winner after action 
+      (0: mover, 1: opponent, -1: no winner).
+    * 'legal': (N_STATES, N_ACTIONS) bool, action is given by 
+      TapnSwap.list_actions (unique actions).
+    * 'flip': (N_STATES,) int, state seen by the other player.
+    * 'game_over': (N_STATES,) bool, game over at this state.
+    * 'state_winner': (N_STATES,) int, winner at this state 
+      (same format than TapnSwap.game_over).
+  """
+
+  tables = {
+    'next_state': - np.ones((N_STATES, N_ACTIONS), dtype = np.int16),
+    'reward': np.zeros((N_STATES, N_ACTIONS)),
+    'terminal': np.zeros((N_STATES, N_ACTIONS), dtype = bool),
+    'winner': - np.ones((N_STATES, N_ACTIONS), dtype = np.int8),
+    'legal': np.zeros((N_STATES, N_ACTIONS), dtype = bool),
+    'flip': np.zeros(N_STATES, dtype = np.int16),
+    'game_over': np.zeros(N_STATES, dtype = bool),
+    'state_winner': - np.ones(N_STATES, dtype = np.int8)
+    }
+
+  tapnswap = TapnSwap()
+  for state in range(N_STATES):
+    hands = unpack_state(state)
+    tables['flip'][state] = pack_state(hands[::-1])
+
+    tapnswap.hands = hands.copy()
+    game_over, winner = tapnswap.game_over()
+    tables['game_over'][state] = game_over
+    tables['state_winner'][state] = winner
+
+    for action in tapnswap.list_actions(0):
+      tables['legal'][state, action_code(action)] = True
+
+    for code, action in enumerate(ACTIONS):
+      tapnswap.hands = hands.copy()
+      try:
+        reward = tapnswap.take_action(0, action)
+      except ValueError:
+        continue
+      game_over, winner = tapnswap.game_over()
+      tables['next_state'][state, code] = pack_state(tapnswap.hands)
+      tables['reward'][state, code] = reward
+      tables['terminal'][state, code] = game_over
+      tables['winner'][state, code] = winner
+
+  return tables
+
+
+# Tables are built once, at import
+_TABLES = build_tables()
+NEXT_STATE = _TABLES['next_state']
+REWARD = _TABLES['reward']
+TERMINAL = _TABLES['terminal']
+WINNER = _TABLES['winner']
+LEGAL = _TABLES['legal']
+FLIP = _TABLES['flip']
+GAME_OVER = _TABLES['game_over']
+STATE_WINNER = _TABLES['state_winner']
+
+# Unique possible actions of the mover for each state, in the same 
+# order than TapnSwap.list_actions
+LIST_ACTIONS = []
+for _state in range(N_STATES):
+  _tapnswap = TapnSwap()
+  _tapnswap.hands = unpack_state(_state)
+  LIST_ACTIONS.append(_tapnswap.list_actions(0))
+
+# Codes of unique possible actions of the mover for each state (same 
+# order than LIST_ACTIONS) and corresponding 8-bit masks 
+# (bit code is set if action of code is possible)
+LEGAL_CODES = [ np.array([action_code(action) for action in actions], 
+                          dtype = np.int8) for actions in LIST_ACTIONS ]
+LEGAL_MASK = np.array([ sum(1 << int(code) for code in codes) 
+                        for codes in LEGAL_CODES ], dtype = np.uint8)
+
+# Python lists for scalar lookups (faster than indexing np.arrays 
+# with Python integers)
+_NEXT_STATE = NEXT_STATE.tolist()
+_REWARD = REWARD.tolist()
+_FLIP = FLIP.tolist()
+_TERMINAL = TERMINAL.tolist()
+_WINNER = WINNER.tolist()
+_GAME_OVER = list(zip(GAME_OVER.tolist(), STATE_WINNER.tolist()))
+_ACTION_CODES = {tuple(action): code for code, action in enumerate(ACTIONS)}
+_LEGAL_CODES = [ tuple(codes.tolist()) for codes in LEGAL_CODES ]
+_LEGAL_MASK = LEGAL_MASK.tolist()
+
+# Transitions from the mover's point of view: for each state and action,
+# (next state seen by mover, next state seen by opponent, reward, game
+# over) or None if the action is not valid
+_TRANSITIONS = [ [ None if _NEXT_STATE[state][code] < 0 else 
+                    (_NEXT_STATE[state][code], 
+                     _FLIP[_NEXT_STATE[state][code]], 
+                     _REWARD[state][code], bool(TERMINAL[state, code]))
+                    for code in range(N_ACTIONS) ] 
+                  for state in range(N_STATES) ]
+
+
+def describe_action(state, code):
+  """
+  Text format of an action (same format than TapnSwap.list_actions_h).
+
+  Parameters
+  ----------
+  state: int
+    Packed state seen by the player who takes action.
+  code: int (in [0, 7])
+    Code of action (index in ACTIONS).
+
+  Return
+  ------
+  action_h: string
+    Action in text format.
+  """
+
+  hands = [state // 125, state // 25 % 5, state // 5 % 5, state % 5]
+  kind, hand, other = ACTIONS[code]
+  # Tap action
+  if kind == 0:
+    return 'Tap with %i on %i' % (hands[hand], hands[2 + other])
+  # Swap action
+  return 'Swap %i-%i for %i-%i' % (hands[0], hands[1], 
+                                    hands[hand] - other, 
+                                    hands[1 - hand] + other)
+
+
+def reachable_states(start = START_STATE):
+  """
+  States reachable from a starting position by possible actions 
+  (TapnSwap.list_actions), with the player who moves as pair 0. Game 
+  over states, where nobody moves, are not included.
+
+  Parameter
+  ---------
+  start: int
+    Packed starting state seen by the player who moves first.
+
+  Return
+  ------
+  states: np.array of int
+    Sorted packed states.
+  """
+
+  seen = {start}
+  stack = [start]
+  while len(stack) > 0:
+    state = stack.pop()
+    for code in LEGAL_CODES[state]:
+      if TERMINAL[state, code]:
+        continue
+      child = int(FLIP[NEXT_STATE[state, code]])
+      if child not in seen:
+        seen.add(child)
+        stack.append(child)
+  return np.array(sorted(state for state in seen if not GAME_OVER[state]))
+
+
+def build_symmetries():
+  """
+  Swapping the left and right hands of a player gives a strategically 
+  identical position. Map each state to a representative of its 
+  positions under these swaps (for both players) and each action to an 
+  equivalent possible action at the representative: actions leading to 
+  positions with the same representative are equivalent.
+
+  Return
+  ------
+  canonical: np.array of N_STATES int
+    Representative (smallest packed state) of each state.
+  canonical_action: np.array of (N_STATES, N_ACTIONS) int
+    Code of equivalent action at the representative state (first one 
+    in the order of TapnSwap.list_actions), -1 if the action is not 
+    given by TapnSwap.list_actions.
+  """
+
+  canonical = np.zeros(N_STATES, dtype = np.int16)
+  for state in range(N_STATES):
+    h0, h1, h2, h3 = (state // 125, state // 25 % 5, state // 5 % 5, 
+                      state % 5)
+    canonical[state] = min(((a * 5 + b) * 5 + c) * 5 + d 
+                            for a, b in ((h0, h1), (h1, h0)) 
+                            for c, d in ((h2, h3), (h3, h2)))
+
+  canonical_action = - np.ones((N_STATES, N_ACTIONS), dtype = np.int8)
+  for state in range(N_STATES):
+    rep = canonical[state]
+    for code in LEGAL_CODES[state]:
+      key = canonical[NEXT_STATE[state, code]]
+      for rep_code in LEGAL_CODES[rep]:
+        if canonical[NEXT_STATE[rep, rep_code]] == key:
+          canonical_action[state, code] = rep_code
+          break
+  return canonical, canonical_action
+
+
+# Symmetries are built once, at import
+CANONICAL, CANONICAL_ACTION = build_symmetries()
+
+
+class TableTapnSwap(TapnSwap):
+    """
+    Table-driven version of TapnSwap: the hands are stored as a 
+    packed integer and each action is a lookup in the transition 
+    tables. TapnSwap remains the reference implementation.
+    The array of hands is only built when asked (show_hands).
+    """
+
+    __slots__ = ('state',)
+
+    def __init__(self):
+        """
+        Initialize 4 hands (2 for each player).
+        """
+
+        self.state = START_STATE
+
+
+    @property
+    def hands(self):
+        """
+        Hands in TapnSwap format, built from the packed state.
+        """
+
+        return unpack_state(self.state)
+
+
+    @hands.setter
+    def hands(self, hands):
+        self.state = pack_state(hands)
+
+
+    def mover_state(self, pair0):
+        """
+        Packed state seen by pair0 (pair0 hands first).
+        """
+
+        if pair0 == 0:
+          return self.state
+        return _FLIP[self.state]
+
+
+    def step(self, pair0, code):
+        """
+        Take action of integer code (index in ACTIONS) for pair0.
+
+        Parameters
+        ----------
+        pair0: int (0 or 1)
+            Index of pair of hands which takes action.
+        code: int (in [0, 7])
+            Code of action taken by pair0.
+
+        Return
+        ------
+        next_state: int
+            Packed state seen by pair0 after action.
+        opp_state: int
+            Packed state seen by the other pair after action (i.e. 
+            state of the player who moves next).
+        reward: float
+            Reward given to pair0.
+        game_over: boolean.
+        """
+
+        if pair0 == 0:
+          transition = _TRANSITIONS[self.state][code]
+          if transition is None: raise ValueError
+          self.state = transition[0]
+        else:
+          transition = _TRANSITIONS[_FLIP[self.state]][code]
+          if transition is None: raise ValueError
+          self.state = transition[1]
+          # Both pairs dead: TapnSwap.game_over declares pair 0 winner
+          if transition[0] == 0:
+            transition = transition[:2] + (- transition[2], True)
+        return transition
+
+
+    def tap(self, pair0, hand0, hand1):
+        """
+        Same as TapnSwap.tap.
+        """
+
+        self.step(pair0, action_code([0, hand0, hand1]))
+
+
+    def swap(self, pair0, hand0, exchange_nbr):
+        """
+        Same as TapnSwap.swap, with at most 2 exchanged fingers 
+        (all swap actions can be described this way).
+        """
+
+        if not 0 < exchange_nbr < 3:
+          raise ValueError
+        self.step(pair0, action_code([1, hand0, exchange_nbr]))
+
+
+    def list_actions(self, pair0):
+        """
+        Same as TapnSwap.list_actions.
+        """
+
+        if pair0 == 0:
+          return list(LIST_ACTIONS[self.state])
+        return list(LIST_ACTIONS[_FLIP[self.state]])
+
+
+    def list_actions_hu(self, pair0):
+        """
+        Same as TapnSwap.list_actions_hu.
+        """
+
+        state = self.mover_state(pair0)
+        return [describe_action(state, code) for code in _LEGAL_CODES[state]]
+
+
+    def legal_codes(self, pair0):
+        """
+        Codes (indices in ACTIONS) of unique possible actions for pair0, 
+        in the same order than list_actions.
+
+        Parameter
+        ---------
+        pair0: int (0 or 1)
+          Index of pair of hands for which one wants to know 
+          the possible actions.
+
+        Return
+        ------
+        codes: tuple of int (shared, not to be modified).
+        """
+
+        return _LEGAL_CODES[self.mover_state(pair0)]
+
+
+    def legal_mask(self, pair0):
+        """
+        8-bit mask of unique possible actions for pair0 (bit code is 
+        set if action of code is possible).
+        """
+
+        return _LEGAL_MASK[self.mover_state(pair0)]
+
+
+    def game_over(self):
+        """
+        Same as TapnSwap.game_over.
+        """
+
+        return _GAME_OVER[self.state]
+
+
+    def take_action(self, pair0, action):
+        """
+        Same as TapnSwap.take_action, for actions found in ACTIONS.
+        """
+
+        code = _ACTION_CODES.get(tuple(action))
+        if code is None: raise ValueError
+        return self.step(pair0, code)[2]
+
+
+    def reset(self):
+        """
+        Reset the count of fingers on each hand.
+        """
+
+        self.state = START_STATE
+
+
+class BatchTapnSwap:
+  """
+  Vectorized version of TableTapnSwap: n_games games are stored as 
+  arrays and stepped together. A finished game is reset at once and 
+  the next game in the same slot is started by the other player.
+  """
+
+  def __init__(self, n_games, start_idx = -1, time_limit = None, 
+                                                      rng = None):
+    """
+    Initialize n_games games.
+
+    Parameters
+    ----------
+    n_games: int
+      Number of games played in lockstep.
+    start_idx: -1, 0, 1 or array of n_games int
+      Index of the player that starts each game (-1: random).
+    time_limit: int (or None)
+      Maximum number of rounds of a game (same meaning than in 
+      train.game_2Agents). A game reaching it is a tie.
+    rng: np.random.Generator (or None)
+      Generator used for random starting players.
+    """
+
+    self.n_games = n_games
+    self.time_limit = time_limit
+    if rng is None:
+      rng = np.random.default_rng()
+    self.rng = rng
+
+    # Packed states (pair 0 first), player to move, rounds played
+    self.states = np.full(n_games, START_STATE, dtype = np.int16)
+    self.player_idx = np.zeros(n_games, dtype = np.int8)
+    self.rounds = np.zeros(n_games, dtype = np.int64)
+
+    # Starting player of the current game of each slot
+    if np.isscalar(start_idx) and start_idx == -1:
+      self.start_idx = rng.integers(0, 2, n_games).astype(np.int8)
+    else:
+      self.start_idx = np.zeros(n_games, dtype = np.int8) + start_idx
+    self.player_idx[:] = self.start_idx
+
+    # Outcome of the last step: done flags and winners
+    self.done = np.zeros(n_games, dtype = bool)
+    self.winner = - np.ones(n_games, dtype = np.int8)
+
+
+  def show_hands(self):
+    """
+    Hands of all games, array of shape (n_games, 2, 2).
+    """
+
+    return np.stack([self.states // 125, self.states // 25 % 5, 
+                      self.states // 5 % 5, self.states % 5], 
+                      axis = 1).reshape(-1, 2, 2)
+
+
+  def mover_states(self):
+    """
+    Packed states seen by the player to move of each game.
+    """
+
+    return np.where(self.player_idx == 0, self.states, FLIP[self.states])
+
+
+  def legal_mask(self):
+    """
+    Boolean array of shape (n_games, N_ACTIONS): possible actions 
+    (unique, as given by TapnSwap.list_actions) of the player to move.
+    """
+
+    return LEGAL[self.mover_states()]
+
+
+  def random_actions(self, mask = None):
+    """
+    Draw a uniformly random action among possible ones for each game.
+
+    Parameter
+    ---------
+    mask: np.array of bool (or None)
+      Possible actions, as given by legal_mask.
+
+    Return
+    ------
+    codes: np.array of n_games int
+      Codes of actions (indices in ACTIONS).
+    """
+
+    if mask is None:
+      mask = self.legal_mask()
+    return np.argmax(self.rng.random(mask.shape) * mask, axis = 1)
+
+
+  def step(self, codes):
+    """
+    Take one action in every game, then reset finished games.
+
+    Parameter
+    ---------
+    codes: np.array of n_games int
+      Codes of actions (indices in ACTIONS) of players to move.
+
+    Return
+    ------
+    rewards: np.array of n_games float
+      Reward given to the player who has just moved.
+    done: np.array of n_games bool
+      Games over after this step (they have been reset).
+    winner: np.array of n_games int
+      Index of winner player of finished games (-1: no winner).
+    """
+
+    states = self.mover_states()
+    next_states = NEXT_STATE[states, codes]
+    if (next_states < 0).any(): raise ValueError
+
+    rewards = REWARD[states, codes]
+    first = self.player_idx == 0
+    # Both pairs dead: TapnSwap.game_over declares pair 0 winner
+    rewards = np.where(~first & (next_states == 0), - rewards, rewards)
+    self.states = np.where(first, next_states, FLIP[next_states])
+
+    self.done = GAME_OVER[self.states]
+    self.winner = np.where(self.done, STATE_WINNER[self.states], -1)
+
+    # Avoid loops
+    if self.time_limit is not None:
+      self.done = self.done | (self.rounds > self.time_limit)
+
+    # Next round
+    self.player_idx = 1 - self.player_idx
+    self.rounds += 1
+    self.reset(self.done)
+
+    return rewards, self.done, self.winner
+
+
+  def reset(self, games = None):
+    """
+    Reset some games. The other player starts the new game.
+
+    Parameter
+    ---------
+    games: np.array of bool (or None)
+      Games to reset (all games if None).
+    """
+
+    if games is None:
+      games = np.ones(self.n_games, dtype = bool)
+    self.states[games] = START_STATE
+    self.rounds[games] = 0
+    self.start_idx[games] = 1 - self.start_idx[games]
+    self.player_idx[games] = self.start_idx[games]
+
+
+def check_parity():
+  """
+  Check that TableTapnSwap agrees with the reference TapnSwap on 
+  every state, player and action (valid or not).
+
+  Return
+  ------
+  n_checks: int
+    Number of (state, player, action) triplets checked.
+  """
+
+  n_checks = 0
+  for state in range(N_STATES):
+    for pair0 in range(2):
+      reference = TapnSwap()
+      table = TableTapnSwap()
+      reference.hands = unpack_state(state)
+      table.state = state
+      assert reference.list_actions(pair0) == table.list_actions(pair0), \
+      'Different actions at state {}'.format(state)
+      assert (reference.list_actions_hu(pair0) == 
+              table.list_actions_hu(pair0)), \
+      'Different actions in text format at state {}'.format(state)
+      assert reference.game_over() == table.game_over(), \
+      'Different game over at state {}'.format(state)
+
+      for action in ACTIONS:
+        reference.hands = unpack_state(state)
+        table.state = state
+        try:
+          reward_ref = reference.take_action(pair0, action)
+        except ValueError:
+          reward_ref = None
+        try:
+          reward_table = table.take_action(pair0, action)
+        except ValueError:
+          reward_table = None
+        assert reward_ref == reward_table, \
+        'Different rewards at state {}, action {}'.format(state, action)
+        assert (reference.hands == table.hands).all(), \
+        'Different hands at state {}, action {}'.format(state, action)
+        assert reference.game_over() == table.game_over(), \
+        'Different game over at state {}, action {}'.format(state, action)
+
+        # States returned by step from both points of view
+        if reward_table is not None:
+          table.state = state
+          next_state, opp_state, _, game_over = table.step(pair0, 
+                                                      action_code(action))
+          assert (next_state == table.mover_state(pair0) and 
+                  opp_state == table.mover_state(1 - pair0) and 
+                  game_over == table.game_over()[0]), \
+          'Different states at state {}, action {}'.format(state, action)
+        n_checks += 1
+  return n_checks
+
+
+def check_batch_parity(n_games = 1000, n_steps = 100, seed = None):
+  """
+  Check that BatchTapnSwap gives the same outcomes than the reference 
+  TapnSwap: random games are played in lockstep, then replayed one by 
+  one with TapnSwap.
+
+  Parameters
+  ----------
+  n_games: int
+    Number of games played in lockstep.
+  n_steps: int
+    Number of vectorized steps.
+  seed: int (or None)
+    Seed of random actions.
+
+  Return
+  ------
+  n_finished: int
+    Number of finished games checked.
+  """
+
+  batch = BatchTapnSwap(n_games, start_idx = -1, 
+                        rng = np.random.default_rng(seed))
+  history = [[] for _ in range(n_games)]
+  starts = batch.player_idx.copy()
+  n_finished = 0
+
+  for _ in range(n_steps):
+    codes = batch.random_actions()
+    rewards, done, winner = batch.step(codes)
+    for game in range(n_games):
+      history[game].append((codes[game], rewards[game]))
+      if not done[game]:
+        continue
+
+      # Replay game with reference engine
+      reference = TapnSwap()
+      player_idx = starts[game]
+      for code, reward in history[game]:
+        assert reference.take_action(player_idx, ACTIONS[code]) == reward, \
+        'Different rewards in game {}'.format(game)
+        player_idx = 1 - player_idx
+      assert reference.game_over() == (True, winner[game]), \
+      'Different outcomes in game {}'.format(game)
+
+      history[game] = []
+      starts[game] = batch.player_idx[game]
+      n_finished += 1
+  return n_finished
+
+
+if __name__ == "__main__":
+
+  n_checks = check_parity()
+  print('TableTapnSwap agrees with TapnSwap on', n_checks, 
+        '(state, player, action) triplets.')
+  n_finished = check_batch_parity()
+  print('BatchTapnSwap agrees with TapnSwap on', n_finished, 'games.')
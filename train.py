@@ -4,7 +4,8 @@ Functions used to manage games between 2 agents, with possibility of
 training, of watching the games, of playing with an agent during 
 training, of testing an agent during training by making it play 
 against another agent and of saving the learned Q-function in 
-CSV format. It is possible to train an already trained model.
+binary format (see model_io). It is possible to train an already 
+trained model.
 """
 
 # Copyright (C) 2020, Jean-Rémy Conti, ENS Paris-Saclay (France).
@@ -12,15 +13,23 @@ CSV format. It is possible to train an already trained model.
 # General Public License along with this program.  
 # If not, see <https://www.gnu.org/licenses/>.
 
-from tapnswap import TapnSwap
+from tapnswap import (TableTapnSwap, N_STATES, ACTIONS, START_STATE, 
+                      NEXT_STATE, TERMINAL, WINNER, LEGAL, FLIP, GAME_OVER, 
+                      LEGAL_CODES, unpack_state)
 from interact import game_1vsAgent, show_score
-from agent import Agent, RandomAgent, RLAgent
+from agent import (Agent, RandomAgent, RLAgent, CompactRLAgent, 
+                    CanonicalRLAgent, spawn_rngs)
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np
+import copy
+import os
 import time
 
 def game_2Agents(agent1, agent2, start_idx = -1, train = True, 
                 time_limit = None, n_games_test = 0,
-                play_checkpoint_usr = False, verbose = False):
+                play_checkpoint_usr = False, verbose = False, 
+                stats = None, rng = None, exact_test = False):
   """
   Manages a game between 2 agents (agent1, agent2) potentially 
   time-limited, with possibility to train them, to confront 1 of 
@@ -32,7 +41,8 @@ def game_2Agents(agent1, agent2, start_idx = -1, train = True,
   Parameters
   ----------
   agent1, agent2: instances of Agent
-    Agents involved in the game.
+    Agents involved in the game. They may be the same agent (self-play 
+    with a shared Q-function): states are seen by the player who moves.
   start_idx: -1, 0 or 1
     Index of the agent that starts the game 
     (0: agent1, 1: agent2, -1: random).
@@ -50,6 +60,16 @@ def game_2Agents(agent1, agent2, start_idx = -1, train = True,
     preceding the game between agent1 and agent2.
   verbose: boolean
     Set to True for a written explanation of each round.
+  stats: dict (or None)
+    If given, it is filled with the number of rounds of the game 
+    ('rounds') and the length in rounds of the loop of positions 
+    ending the game ('cycle_length', 0 if no loop).
+  rng: np.random.Generator, int (or None)
+    Random generator (or seed) of the game, used to select the 
+    starting agent and by the Random Agent of tests.
+  exact_test: boolean
+    Set to True to replace the test games against a Random Agent by 
+    their exact expectation (see evaluate_vs_random).
 
   Return
   ------
@@ -64,8 +84,9 @@ def game_2Agents(agent1, agent2, start_idx = -1, train = True,
     * test_results[3]: score of Random Agent.
   """
 
-  tapnswap = TapnSwap()
+  tapnswap = TableTapnSwap()
   tapnswap.reset()
+  rng = np.random.default_rng(rng)
 
   # Time of pause between several actions (if verbose)
   delay = 2
@@ -77,8 +98,7 @@ def game_2Agents(agent1, agent2, start_idx = -1, train = True,
   
   # Select starting player
   if start_idx == -1:
-    np.random.seed()
-    player_idx = np.random.randint(0,2)
+    player_idx = int(rng.integers(0,2))
   else:
     assert start_idx == 0 or start_idx == 1, \
     'The starting agent index must be 0, 1 or -1.'
@@ -88,40 +108,56 @@ def game_2Agents(agent1, agent2, start_idx = -1, train = True,
   names = ['Agent1', 'Agent2']
 
   count_rounds = 0
-  prev_state = []
-  prev_action = []
+  # Last state and action of each player (index of agent), waiting 
+  # for the response of the environment
+  prev_states = [None, None]
+  prev_actions = [None, None]
+
+  # Current state (packed) seen by the player who moves
+  state = tapnswap.mover_state(player_idx)
+
+  # Without training, if both agents always take the same action at 
+  # a given state, a repeated position (with the same player to move) 
+  # means that the game loops forever: it is a tie
+  check_cycles = (not train and agent1.is_deterministic(greedy = train)
+                  and agent2.is_deterministic(greedy = train))
+  # Round of first visit of each position, indexed by 
+  # player_idx * N_STATES + state
+  visited = {player_idx * N_STATES + state: 0}
+  cycle_length = 0
 
   # Start game
   game_over = False
+  winner = -1
   while not game_over:
     if verbose:
       # Print current configuration
       show_score(tapnswap, names, 1 - player_idx, invert = False)
       time.sleep(delay)
 
-    # Get current state
-    hands = tapnswap.show_hands().copy()
-    state = [ hands[player_idx], hands[1 - player_idx] ]
     # Choose action
-    actions = tapnswap.list_actions(player_idx)
-    action = agents[player_idx].choose_action(state, actions, 
-                                              greedy = train)
-    # Take action and get reward
-    reward = tapnswap.take_action(player_idx, action)
+    actions = tapnswap.legal_codes(player_idx)
+    action = agents[player_idx].choose_code(state, actions, 
+                                            greedy = train)
+    # Take action and get reward, new state seen by both players
+    next_state, opp_state, reward, game_over = tapnswap.step(player_idx, 
+                                                              action)
 
     if verbose:
       # Print chosen action
+      hands = unpack_state(state)
+      raw_action = ACTIONS[action]
       seq = str(names[player_idx])
-      if action[0] == 0:
+      if raw_action[0] == 0:
         seq = seq + str(' tapped with ' + 
-                str(hands[player_idx, action[1]]) + ' on ' + 
-                str(hands[1 - player_idx, action[2]]))
+                str(hands[0, raw_action[1]]) + ' on ' + 
+                str(hands[1, raw_action[2]]))
       else:
-        new_hands = tapnswap.show_hands().copy()
-        seq = seq + str(' swapped ' + str(hands[player_idx][0]) + 
-                        '-' + str(hands[player_idx][1]) + ' for ' + 
-                        str(new_hands[player_idx][0]) + '-' + 
-                        str(new_hands[player_idx][1]))
+        new_hands = unpack_state(next_state)
+        seq = seq + str(' swapped ' + str(hands[0][0]) + 
+                        '-' + str(hands[0][1]) + ' for ' + 
+                        str(new_hands[0][0]) + '-' + 
+                        str(new_hands[0][1]))
       print(seq)
       time.sleep(delay)
       print()
@@ -133,28 +169,26 @@ def game_2Agents(agent1, agent2, start_idx = -1, train = True,
       time.sleep(delay)
       print('----------------------------')
 
-    game_over, winner = tapnswap.game_over()
+    if game_over:
+      _, winner = tapnswap.game_over()
 
     # Training
     if train:
-      # Get new state
-      next_hands = tapnswap.show_hands().copy()
-      next_state = [ next_hands[player_idx], next_hands[1 - player_idx] ]
       # Train playing agent for a winning move
       if game_over:
-        agents[player_idx].update_Q(state, action, reward, next_state)
+        agents[player_idx].update_Q_code(state, action, reward, next_state)
       # Train waiting agent (response of the environment)
-      if count_rounds:
-        # New state in other's agent point of view
-        inv_next_state = [ next_hands[1 - player_idx], 
-                            next_hands[player_idx] ]
+      if prev_states[1 - player_idx] is not None:
         # Each waiting agent receives the transition with the 
-        # response of the environment for the new state
-        agents[1 - player_idx].update_Q(prev_state, prev_action, 
-                                        - reward, inv_next_state)
-      # Keep in memory previous state and action
-      prev_state = state
-      prev_action = action
+        # response of the environment for the new state (seen 
+        # from its point of view). If agent1 and agent2 are the 
+        # same agent, it learns from the transitions of both seats
+        agents[1 - player_idx].update_Q_code(prev_states[1 - player_idx], 
+                                              prev_actions[1 - player_idx],
+                                              - reward, opp_state)
+      # Keep in memory previous state and action of playing agent
+      prev_states[player_idx] = state
+      prev_actions[player_idx] = action
 
     # Avoid loops
     if time_limit is not None:
@@ -164,12 +198,33 @@ def game_2Agents(agent1, agent2, start_idx = -1, train = True,
 
     # Next round
     player_idx = 1 - player_idx
+    state = opp_state
     count_rounds += 1
 
-  # Test of agent1
+    # Repeated position
+    if check_cycles and not game_over:
+      key = player_idx * N_STATES + state
+      if key in visited:
+        game_over = True
+        winner = -1
+        cycle_length = count_rounds - visited[key]
+        if verbose:
+          print('Tie: loop of', cycle_length, 'rounds')
+      else:
+        visited[key] = count_rounds
+
+  if stats is not None:
+    stats['rounds'] = count_rounds
+    stats['cycle_length'] = cycle_length
+
+  # Test of agent1 (with the transitions of its ReplayBuffer applied)
   test_results = []
   if bool(n_games_test):
-    random_agent = RandomAgent()
+    agent1.flush()
+  if bool(n_games_test) and exact_test:
+    test_results = evaluate_vs_random(agent1, n_games = n_games_test)
+  elif bool(n_games_test):
+    random_agent = RandomAgent(rng = rng)
     test_results = compare_agents(agent1, random_agent, 
                                   n_games = n_games_test, 
                                   time_limit = None, verbose = False)
@@ -177,9 +232,82 @@ def game_2Agents(agent1, agent2, start_idx = -1, train = True,
   return game_over, winner, test_results
 
 
-def compare_agents(agent1, agent2, n_games, time_limit = None, verbose = True):
+def play_games(agent1, agent2, first_game, last_game, n_games, 
+                time_limit = None, verbose = False, stats = None):
+  """
+  Games first_game to last_game (numbered from 1) of a comparison of 
+  n_games games between 2 agents (see compare_agents): agent1 starts 
+  odd games and agent2 even games. If both agents are deterministic 
+  (see Agent.is_deterministic), the game is played once for each 
+  starting agent.
+
+  Parameters
+  ----------
+  agent1, agent2: instances of Agent.
+  first_game, last_game: int
+    Numbers of first and last games.
+  n_games: int
+    Total number of games of the comparison.
+  time_limit, verbose, stats:
+    Same as in compare_agents.
+
+  Return
+  ------
+  scores: list of int
+    Scores of agent1 and of agent2.
+  """
+
+  scores = [0,0]
+  if stats is not None:
+    stats.update({'rounds': 0, 'cycles': 0, 'cycle_lengths': []})
+
+  # If both agents always take the same action at a given state, a 
+  # game only depends on the starting agent: each starting agent 
+  # plays once and the outcome is reused for the next games
+  deterministic = (agent1.is_deterministic(greedy = False) and 
+                    agent2.is_deterministic(greedy = False))
+  outcomes = {}
+
+  for game in range(first_game, last_game + 1):
+    if game % (n_games // 10) == 0 and verbose:
+      print(game, '/', n_games)
+
+    start_idx = (game - 1) % 2
+    if start_idx in outcomes:
+      winner, game_stats = outcomes[start_idx]
+    else:
+      game_stats = {}
+      game_over, winner, _ = game_2Agents(agent1, agent2, 
+                                          start_idx = start_idx, 
+                                          train = False, 
+                                          time_limit = time_limit, 
+                                          n_games_test = 0, 
+                                          play_checkpoint_usr = False, 
+                                          verbose = False, 
+                                          stats = game_stats)
+      if deterministic:
+        outcomes[start_idx] = (winner, game_stats)
+
+    # Update scores
+    if winner in [0,1]:
+      scores[winner] += 1
+
+    if stats is not None:
+      stats['rounds'] += game_stats['rounds']
+      if game_stats['cycle_length'] > 0:
+        stats['cycles'] += 1
+        stats['cycle_lengths'].append(game_stats['cycle_length'])
+
+  return scores
+
+
+def compare_agents(agent1, agent2, n_games, time_limit = None, verbose = True,
+                    stats = None, workers = None, seed = None, 
+                    chunk_size = 250):
   """
-  Manages competitive games between 2 agents and return final scores.
+  Manages competitive games between 2 agents and return final scores. 
+  If both agents are deterministic (see Agent.is_deterministic), the 
+  game is played once for each starting agent.
 
   Parameters
   ----------
@@ -190,7 +318,24 @@ def compare_agents(agent1, agent2, n_games, time_limit = None, verbose = True):
     Maximum number of rounds between the 2 agents (possibility of 
     loops with optimal actions).
   verbose: boolean
-    Set to True to know which of the n_games is currently played.
+    Set to True to know which of the n_games is currently played (or 
+    the speed of each worker).
+  stats: dict (or None)
+    If given, it is filled with the total number of rounds ('rounds'), 
+    the number of games ended by a loop of positions ('cycles') and 
+    the lengths of these loops ('cycle_lengths'). With workers, it 
+    also gives the number of games, time and games per second of each 
+    worker ('workers').
+  workers: int (or None)
+    If given, the games are split into chunks of chunk_size games 
+    played by a pool of workers processes (see compare_parallel). 
+    Deterministic agents are always compared in the current process.
+  seed: int (or None)
+    Only used with workers: master seed of the random generators of 
+    the chunks of games. Results only depend on seed and chunk_size, 
+    not on the number of workers.
+  chunk_size: int
+    Only used with workers: number of games of each chunk.
 
   Return
   ------
@@ -201,41 +346,427 @@ def compare_agents(agent1, agent2, n_games, time_limit = None, verbose = True):
     results[3]: score of agent2.
   """
 
-  start_idx = 0
-  scores = [0,0]
+  deterministic = (agent1.is_deterministic(greedy = False) and 
+                    agent2.is_deterministic(greedy = False))
+  if workers is not None and not deterministic:
+    scores = compare_parallel(agent1, agent2, n_games, workers, 
+                              time_limit = time_limit, seed = seed, 
+                              chunk_size = chunk_size, verbose = verbose, 
+                              stats = stats)
+  else:
+    # Start games
+    if verbose:
+      print('Number of games:')
+    scores = play_games(agent1, agent2, 1, n_games, n_games, 
+                        time_limit = time_limit, verbose = verbose, 
+                        stats = stats)
+
+  # Output results
+  results = [scores[0]+scores[1], n_games, scores[0], scores[1]]
+
+  return results
+
+
+def share_arrays(agents):
+  """
+  Copy the arrays of agents (Q function, counter, policy...) into 
+  shared memory blocks, so that worker processes read them without 
+  copy. An array shared by several agents is copied once.
+
+  Parameter
+  ---------
+  agents: list of instances of Agent.
+
+  Return
+  ------
+  light_agents: list
+    Copies of agents without their arrays (set to None), along with 
+    a dictionary {attribute: (name of block, shape, dtype)}.
+  blocks: list of shared_memory.SharedMemory
+    Blocks to close and unlink after use.
+  """
+
+  blocks = []
+  specs = {}
+  light_agents = []
+  for agent in agents:
+    light_agent = copy.copy(agent)
+    arrays = {}
+    for key, value in vars(agent).items():
+      if not isinstance(value, np.ndarray) or value.nbytes == 0:
+        continue
+      if id(value) not in specs:
+        block = shared_memory.SharedMemory(create = True, 
+                                            size = value.nbytes)
+        np.ndarray(value.shape, dtype = value.dtype, 
+                    buffer = block.buf)[...] = value
+        blocks.append(block)
+        specs[id(value)] = (block.name, value.shape, value.dtype.str)
+      arrays[key] = specs[id(value)]
+      setattr(light_agent, key, None)
+    light_agents.append((light_agent, arrays))
+  return light_agents, blocks
+
+
+# Agents and shared memory blocks of a worker process
+_WORKER = {}
+
+
+def _init_worker(light_agents, time_limit):
+  """
+  Initializer of worker processes: attach the arrays of agents in 
+  shared memory (read-only, see share_arrays).
+  """
+
+  blocks = {}
+  agents = []
+  for light_agent, arrays in light_agents:
+    for key, (name, shape, dtype) in arrays.items():
+      if name not in blocks:
+        blocks[name] = shared_memory.SharedMemory(name = name)
+      array = np.ndarray(shape, dtype = dtype, buffer = blocks[name].buf)
+      array.flags.writeable = False
+      setattr(light_agent, key, array)
+    agents.append(light_agent)
+  _WORKER.update({'agents': agents, 'blocks': blocks, 
+                  'time_limit': time_limit})
+
+
+def _play_chunk(chunk):
+  """
+  Play a chunk of games in a worker process, with random generators 
+  of agents derived from the seed of the chunk.
+
+  Parameter
+  ---------
+  chunk: tuple
+    (first game, last game, n_games, np.random.SeedSequence).
+
+  Return
+  ------
+  scores, stats: results of play_games.
+  pid, elapsed: process and time of the chunk.
+  """
+
+  first_game, last_game, n_games, seed = chunk
+  agent1, agent2 = _WORKER['agents']
+  rngs = spawn_rngs(seed, 2)
+  agent1.rng = rngs[0]
+  if agent2 is not agent1:
+    agent2.rng = rngs[1]
 
-  # Start games
+  start = time.perf_counter()
+  chunk_stats = {}
+  scores = play_games(agent1, agent2, first_game, last_game, n_games, 
+                      time_limit = _WORKER['time_limit'], 
+                      stats = chunk_stats)
+  return scores, chunk_stats, os.getpid(), time.perf_counter() - start
+
+
+def compare_parallel(agent1, agent2, n_games, workers, time_limit = None, 
+                      seed = None, chunk_size = 250, verbose = True, 
+                      stats = None):
+  """
+  Games of compare_agents played by a pool of processes. Games are 
+  split into chunks of chunk_size consecutive games, each chunk 
+  having its own random generators (spawned from seed, see 
+  spawn_rngs), and the results of chunks are merged in order: the 
+  results only depend on seed and chunk_size. The arrays of agents 
+  are shared with the workers (see share_arrays).
+
+  Parameters
+  ----------
+  agent1, agent2: instances of Agent.
+  n_games: int
+    Number of games.
+  workers: int
+    Number of processes.
+  time_limit, seed, chunk_size, verbose, stats: 
+    Same as in compare_agents.
+
+  Return
+  ------
+  scores: list of int
+    Scores of agent1 and of agent2.
+  """
+
+  seeds = np.random.SeedSequence(seed).spawn((n_games + chunk_size - 1) // 
+                                              chunk_size)
+  chunks = [ (first, min(first + chunk_size - 1, n_games), n_games, 
+              seeds[idx]) for idx, first in enumerate(range(1, n_games + 1, 
+                                                            chunk_size)) ]
+
+  light_agents, blocks = share_arrays([agent1, agent2])
+  try:
+    with ProcessPoolExecutor(max_workers = workers, 
+                              initializer = _init_worker, 
+                              initargs = (light_agents, time_limit)) as pool:
+      outputs = list(pool.map(_play_chunk, chunks))
+  finally:
+    for block in blocks:
+      block.close()
+      block.unlink()
+
+  # Merge results of chunks in order
+  scores = [0,0]
+  if stats is not None:
+    stats.update({'rounds': 0, 'cycles': 0, 'cycle_lengths': [], 
+                  'workers': []})
+  # Number of games and time of each worker
+  speeds = {}
+  for (first, last, _, _), (chunk_scores, chunk_stats, pid, elapsed) in \
+                                                      zip(chunks, outputs):
+    scores[0] += chunk_scores[0]
+    scores[1] += chunk_scores[1]
+    if stats is not None:
+      stats['rounds'] += chunk_stats['rounds']
+      stats['cycles'] += chunk_stats['cycles']
+      stats['cycle_lengths'] += chunk_stats['cycle_lengths']
+    games, total = speeds.get(pid, (0, 0.0))
+    speeds[pid] = (games + last - first + 1, total + elapsed)
+
+  # Speed of each worker
+  worker_stats = [ {'games': games, 'time': total, 
+                    'games_per_sec': games / max(total, 1e-9)} 
+                    for games, total in speeds.values() ]
+  if stats is not None:
+    stats['workers'] = worker_stats
   if verbose:
-    print('Number of games:')
+    for idx, worker in enumerate(worker_stats):
+      print('Worker {}: {} games in {:.2f} s ({:.0f} games/s)'.format(
+            idx, worker['games'], worker['time'], worker['games_per_sec']))
 
-  for game in range(1, n_games + 1):
-    if game % (n_games // 10) == 0 and verbose:
-      print(game, '/', n_games)
+  return scores
 
-    game_over, winner, _ = game_2Agents(agent1, agent2, 
-                                        start_idx = start_idx, 
-                                        train = False, 
-                                        time_limit = time_limit, 
-                                        n_games_test = 0, 
-                                        play_checkpoint_usr = False, 
-                                        verbose = False)
-    # Update scores
-    if winner in [0,1]:
-      scores[winner] += 1
 
-    start_idx = 1 - start_idx
+def compare_policies(policies, n_games = 10, time_limit = None):
+  """
+  Results of compare_agents for every ordered pair of agents playing 
+  compiled policies (see RLAgent.compile_policy and PolicyAgent), 
+  without playing each game: as in compare_agents, deterministic 
+  agents play once for each starting agent, and all these K x K x 2 
+  games are played at once in lockstep with the tables of tapnswap. A 
+  game ending in a repeated position (with the same player to move) 
+  is a tie, as in game_2Agents.
 
-  # Output results
-  results = [scores[0]+scores[1], n_games, scores[0], scores[1]]
+  Parameters
+  ----------
+  policies: np.array of shape (K, N_STATES) (or list of K policies)
+    Code of action of each agent for each packed state seen by the 
+    player who moves.
+  n_games: int
+    Number of games of each match.
+  time_limit: int (or None)
+    Maximum number of rounds of a game (same as in game_2Agents).
+
+  Return
+  ------
+  results: np.array of shape (K, K, 2) int
+    results[i, j]: scores of agent i and of agent j in 
+    compare_agents(agent i, agent j, n_games, time_limit) 
+    (results[2] and results[3] of compare_agents).
+  """
+
+  policies = np.asarray(policies, dtype = np.int64)
+  n_agents = len(policies)
+
+  # Games (agent1, agent2, starting agent)
+  agent1, agent2, start_idx = [ index.ravel() for index in np.meshgrid(
+                                  np.arange(n_agents), np.arange(n_agents), 
+                                  np.arange(2), indexing = 'ij') ]
+  n = len(agent1)
+  winners = - np.ones(n, dtype = np.int64)
+
+  # Games in progress: packed state seen by the player who moves, 
+  # player to move and positions already seen (bits of 
+  # player_idx * N_STATES + state)
+  games = np.arange(n)
+  states = np.full(n, START_STATE, dtype = np.int64)
+  player_idx = start_idx.copy()
+  n_words = (2 * N_STATES + 63) // 64
+  visited = np.zeros((n, n_words), dtype = np.uint64)
+  keys = player_idx * N_STATES + states
+  visited[games, keys // 64] = np.uint64(1) << (keys % 64).astype(np.uint64)
+  count_rounds = 0
+
+  while len(games) > 0:
+    # Actions of players to move
+    players = np.where(player_idx == 0, agent1[games], agent2[games])
+    codes = policies[players, states]
+    end = TERMINAL[states, codes]
+    # Winner (0: player to move) in mover's point of view
+    winners[games[end]] = np.where(WINNER[states[end], codes[end]] == 0, 
+                                    player_idx[end], 1 - player_idx[end])
+    go_on = ~ end
+    if time_limit is not None and count_rounds > time_limit:
+      go_on[:] = False
+
+    # Next round
+    games = games[go_on]
+    states = FLIP[NEXT_STATE[states[go_on], codes[go_on]]].astype(np.int64)
+    player_idx = 1 - player_idx[go_on]
+    visited = visited[go_on]
+    count_rounds += 1
 
+    # Repeated position: tie
+    keys = player_idx * N_STATES + states
+    rows = np.arange(len(games))
+    bits = np.uint64(1) << (keys % 64).astype(np.uint64)
+    words = visited[rows, keys // 64]
+    new = (words & bits) == 0
+    visited[rows, keys // 64] = words | bits
+    games = games[new]
+    states = states[new]
+    player_idx = player_idx[new]
+    visited = visited[new]
+
+  # Scores of matches: agent1 starts the first game, as in compare_agents
+  winners = winners.reshape(n_agents, n_agents, 2)
+  n_starts = np.array([(n_games + 1) // 2, n_games // 2])
+  results = np.stack([ ((winners == player) * n_starts).sum(axis = 2) 
+                        for player in range(2) ], axis = 2)
   return results
 
 
+def evaluate_vs_random(agent, n_games, time_limit = None, stats = None):
+  """
+  Exact expectation of compare_agents(agent, RandomAgent(), n_games, 
+  time_limit) for an agent whose optimal decisions only depend on the 
+  current state (see Agent.is_deterministic). The games are then an 
+  absorbing Markov chain over the states where the Random Agent moves 
+  (a round of the Random Agent followed by the reply of the agent), 
+  solved for the probabilities of win, loss and tie of the agent.
+
+  Parameters
+  ----------
+  agent: instance of Agent.
+  n_games: int
+    Number of games (the agent starts one game out of 2, as in 
+    compare_agents).
+  time_limit: int (or None)
+    Maximum number of rounds (same as in game_2Agents). If None, the 
+    only ties are games that can never end.
+  stats: dict (or None)
+    If given, it is filled with the probabilities [win, loss, tie] of 
+    the agent when it starts ('agent_starts') and when the Random 
+    Agent starts ('random_starts').
+
+  Return
+  ------
+  results: list of float
+    Expected results of compare_agents (same format).
+  """
+
+  assert agent.is_deterministic(greedy = False), \
+  'The decisions of the agent must only depend on the current state.'
+
+  # Action of the agent at each state
+  if hasattr(agent, 'compile_policy'):
+    policy = agent.compile_policy().astype(np.int64)
+  else:
+    policy = np.zeros(N_STATES, dtype = np.int64)
+    for state in np.flatnonzero(~ GAME_OVER):
+      policy[state] = agent.choose_code(int(state), 
+                                  tuple(LEGAL_CODES[state].tolist()))
+  playing = ~ GAME_OVER
+  states = np.arange(N_STATES)
+  # Outcome of the action of the agent (seen by the agent)
+  agent_end = np.where(playing, TERMINAL[states, policy], False)
+  agent_win = agent_end & (WINNER[states, policy] == 0)
+  agent_loss = agent_end & (WINNER[states, policy] == 1)
+  agent_next = np.where(playing & ~ agent_end, 
+                        FLIP[NEXT_STATE[states, policy]], 0)
+
+  # Replies of the Random Agent (uniform among possible actions) at 
+  # states seen by the Random Agent, then action of the agent
+  random_states, random_codes = np.nonzero(LEGAL)
+  weights = 1.0 / LEGAL.sum(axis = 1)[random_states]
+  random_end = TERMINAL[random_states, random_codes]
+  random_winner = WINNER[random_states, random_codes]
+  replies = np.where(random_end, 0, 
+                      FLIP[NEXT_STATE[random_states, random_codes]])
+  # Probabilities of ending with the move of the Random Agent, with the 
+  # reply of the agent, or of continuing (transition matrix P)
+  win_random = np.zeros(N_STATES)
+  loss_random = np.zeros(N_STATES)
+  np.add.at(win_random, random_states, weights * (random_end & 
+                                                  (random_winner == 1)))
+  np.add.at(loss_random, random_states, weights * (random_end & 
+                                                    (random_winner == 0)))
+  go_on = ~ random_end
+  win_agent = np.zeros(N_STATES)
+  loss_agent = np.zeros(N_STATES)
+  np.add.at(win_agent, random_states[go_on], 
+            weights[go_on] * agent_win[replies[go_on]])
+  np.add.at(loss_agent, random_states[go_on], 
+            weights[go_on] * agent_loss[replies[go_on]])
+  go_on &= ~ agent_end[replies]
+  P = np.zeros((N_STATES, N_STATES))
+  np.add.at(P, (random_states[go_on], agent_next[replies[go_on]]), 
+            weights[go_on])
+  win = win_random + win_agent
+  loss = loss_random + loss_agent
+
+  if time_limit is None:
+    # States from which the game can end (the others loop forever)
+    ending = (win + loss) > 0
+    while True:
+      new_ending = ending | (P[:, ending].sum(axis = 1) > 0)
+      if (new_ending == ending).all():
+        break
+      ending = new_ending
+    T = np.flatnonzero(ending)
+    # Absorption probabilities: x = b + P x over states of T
+    b = np.stack([win[T], loss[T], P[np.ix_(T, np.flatnonzero(~ ending))
+                                        ].sum(axis = 1)], axis = 1)
+    x = np.linalg.solve(np.eye(len(T)) - P[np.ix_(T, T)], b)
+    outcomes = np.zeros((N_STATES, 3))
+    outcomes[:, 2] = 1.0
+    outcomes[T] = x
+    random_outcomes = outcomes
+    agent_outcomes = outcomes
+  else:
+    # The game stops after time_limit + 2 actions: outcomes[k] with 
+    # k remaining actions, from states seen by the Random Agent
+    n_actions = time_limit + 2
+    zeros = np.zeros(N_STATES)
+    outcomes = [np.stack([zeros, zeros, zeros + 1.0], axis = 1), 
+                np.stack([win_random, loss_random, 
+                          1.0 - win_random - loss_random], axis = 1)]
+    immediate = np.stack([win, loss, zeros], axis = 1)
+    for k in range(2, n_actions + 1):
+      outcomes.append(immediate + P @ outcomes[k - 2])
+    random_outcomes = outcomes[n_actions]
+    agent_outcomes = outcomes[n_actions - 1]
+
+  # Probabilities [win, loss, tie] of the agent from the start
+  p_random = random_outcomes[START_STATE]
+  if agent_end[START_STATE]:
+    p_agent = np.array([float(agent_win[START_STATE]), 
+                        float(agent_loss[START_STATE]), 0.0])
+  else:
+    p_agent = agent_outcomes[agent_next[START_STATE]]
+  if stats is not None:
+    stats['agent_starts'] = p_agent.tolist()
+    stats['random_starts'] = p_random.tolist()
+
+  # Expected results of n_games (the agent starts the first game)
+  n_agent = (n_games + 1) // 2
+  n_random = n_games // 2
+  score = float(n_agent * p_agent[0] + n_random * p_random[0])
+  ties = float(n_agent * p_agent[2] + n_random * p_random[2])
+  finished = n_games - ties
+  return [finished, n_games, score, finished - score]
+
+
 def train(n_epochs, epsilon, gamma, load_model, filename, random_opponent, 
-          n_games_test, freq_test, n_skip_games = int(0), verbose = False):
+          n_games_test, freq_test, n_skip_games = int(0), verbose = False,
+          seed = None, replay_size = None, q_dtype = np.float64, 
+          count_dtype = np.uint32, layout = 'dense', shared = False,
+          exact_test = False):
   """
   Train 2 agents by making them play and learn together. Save the
-  learned Q-function into CSV file. It is possible to confront 1 of 
+  learned Q-function into a binary model file. It is possible to confront 1 of 
   the agents (against either the user or a Random Agent) during 
   training, as often as one wants. It is also possible to train an already 
   trained model.
@@ -250,16 +781,18 @@ def train(n_epochs, epsilon, gamma, load_model, filename, random_opponent,
     Factor of significance of first actions over last ones for the 
     2 RL Agents.
   load_model: string
-    CSV filename in which is stored the learned Q-function of an 
+    Name of the model in which is stored the learned Q-function of an 
     agent. If load_model = 'model', the function loads the model 
-    './Models/model.csv'. If load_model is not None, the previous 
-    parameters epsilon and gamma are used for a second training.
+    './Models/model.model' (or legacy './Models/model.csv'). If 
+    load_model is not None, the previous parameters epsilon and gamma 
+    are used for a second training.
   filename: string
-    Name of the CSV file that will store the learned Q-function 
-    of one of the agents. The path to CSV file is 
-    then ./Models/filename.csv. The counter of state-action
-    pairs is also stored at ./Models/data/count_filename.csv for
-    future training.
+    Name of the model that will store the learned Q-function 
+    of one of the agents. The path to the binary model file is 
+    then ./Models/filename.model (see model_io). It also stores the 
+    counter of state-action pairs for future training, the state of 
+    the random generator of the agent and the history of training 
+    (epsilon, gamma, epochs, opponents).
   random_opponent: boolean
     If set to true, the function trains 1 RL Agent by making it 
     play against a Random Agent. Otherwise, the RL agent is
@@ -284,6 +817,34 @@ def train(n_epochs, epsilon, gamma, load_model, filename, random_opponent,
   verbose: boolean
     If set to True, each game action during training has a 
     written explanation.
+  seed: int (or None)
+    Master seed from which the random generators of both agents and 
+    of the games are derived: a seeded training is reproducible. 
+    If None and load_model is given, the learning agent resumes the 
+    random generator saved with the model.
+  replay_size: int (or None)
+    If given, the RL Agents store their transitions in a replay buffer 
+    of this size and update their Q-function by batches when it is 
+    full (see RLAgent). Otherwise, they are updated at each transition.
+  q_dtype, count_dtype: NumPy dtypes
+    Storage types of the Q-function and of the counter of state-action 
+    pairs of the RL Agents, kept in the saved model (see RLAgent).
+  layout: 'dense', 'compact' or 'canonical'
+    Storage of the Q-function of the RL Agents: 625 x 8 array 
+    (RLAgent), reachable states and possible actions only 
+    (CompactRLAgent) or representative states under the swaps of 
+    hands (CanonicalRLAgent). The last 2 layouts do not support replay 
+    buffers. The model is saved in the usual format.
+  shared: boolean
+    Only used if random_opponent is False. If set to True, both 
+    players are the same RL Agent: it learns from the transitions 
+    of both seats in a single Q-function. Otherwise, the RL Agent 
+    plays against an independent copy of itself and only learns 
+    from its own transitions.
+  exact_test: boolean
+    Set to True to compute the results of the tests against a Random 
+    Agent exactly (expected results of n_games_test games, see 
+    evaluate_vs_random) instead of playing them.
 
   Return
   ------
@@ -295,18 +856,35 @@ def train(n_epochs, epsilon, gamma, load_model, filename, random_opponent,
     n_games test].
   """
 
+  # Independent random generators of agent1, agent2 and games
+  rngs = spawn_rngs(seed, 3)
+
+  # Layout of Q-function
+  agent_classes = {'dense': RLAgent, 'compact': CompactRLAgent, 
+                    'canonical': CanonicalRLAgent}
+  assert layout in agent_classes, 'Unknown layout {}.'.format(layout)
+  agent_class = agent_classes[layout]
+
   # Learning agent
-  agent1 = RLAgent(epsilon, gamma)
+  agent1 = agent_class(epsilon, gamma, rng = rngs[0], 
+                        replay_size = replay_size, q_dtype = q_dtype, 
+                        count_dtype = count_dtype)
   if load_model is not None:
-    agent1.load_model(load_model)
+    agent1.load_model(load_model, load_rng = seed is None)
   
   # Choose opponent 
   if random_opponent:
-    agent2 = RandomAgent()
+    agent2 = RandomAgent(rng = rngs[1])
     time_limit = None
     print('Training vs Random')
+  elif shared:
+    agent2 = agent1
+    time_limit = None
+    print('Training vs Self (shared Q-function)')
   else:
-    agent2 = RLAgent(epsilon, gamma)
+    agent2 = agent_class(epsilon, gamma, rng = rngs[1], 
+                          replay_size = replay_size, q_dtype = q_dtype, 
+                          count_dtype = count_dtype)
     if load_model is not None:
       agent2.load_model(load_model)
     time_limit = None
@@ -358,7 +936,8 @@ def train(n_epochs, epsilon, gamma, load_model, filename, random_opponent,
                                     time_limit = time_limit, 
                                     n_games_test = n_games_test,
                                     play_checkpoint_usr = play_checkpoint_usr,
-                                    verbose = verbose)
+                                    verbose = verbose, rng = rngs[2],
+                                    exact_test = exact_test)
     
     assert game_over, str('Game not over but new game' +
                           ' beginning during training')
@@ -376,11 +955,18 @@ def train(n_epochs, epsilon, gamma, load_model, filename, random_opponent,
     # Next round
     start_idx = 1 - start_idx
 
-  # Save Q-function of agent1
-  np.savetxt(str('Models/' + filename + '.csv'), agent1.Q, delimiter=',')
-  # Save stats for learning rate of agent1
-  np.savetxt(str('Models/data/count_' + filename + '.csv'), 
-              agent1.count_state_action, delimiter=',')
+  # Apply remaining transitions of agent1
+  agent1.flush()
+
+  # Save Q-function of agent1, stats for learning rate of agent1, 
+  # state of its random generator and history of training
+  metadata = agent1.metadata
+  agent1.save_model(filename, metadata = {
+    'epsilon': epsilon, 'gamma': gamma, 
+    'epochs': metadata.get('epochs', 0) + n_epochs,
+    'opponents': metadata.get('opponents', []) + 
+                  ['Random' if random_opponent else 'Self'],
+    'seed': seed})
 
   return learning_results
 
@@ -15,9 +15,28 @@ agents, according to their total score during the tournament.
 # If not, see <https://www.gnu.org/licenses/>.
 
 from agent import Agent, RandomAgent, RLAgent
-from train import compare_agents, train
+from train import compare_agents, compare_policies, train
+from model_io import model_exists, remove_model, rename_model, MODEL_CACHE
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
 import numpy as np
 import os
+import time
+
+# Directory of log files of parallel jobs
+LOGS_DIR = 'Models/logs'
+
+
+def run_logged(job, args, log_path):
+  """
+  Run a job with its output written in a log file (used by worker 
+  processes of Optimizer.run_jobs).
+  """
+
+  with open(log_path, 'w') as log:
+    with contextlib.redirect_stdout(log):
+      return job(*args)
+
 
 class Optimizer:
   """
@@ -65,7 +84,7 @@ class Optimizer:
 
 
   def grid_search(self, n_epochs, n_games_test = 100, freq_test = 0,
-                                                    retrain = False):
+                  retrain = False, exact_test = False, workers = None):
     """
     Compute the fraction of an agent's wins over a given number of 
     games against a Random Agent. This fraction is computed as a
@@ -89,6 +108,14 @@ class Optimizer:
     retrain: boolean
       Set to True to do the grid-search via training of already
       trained models.
+    exact_test: boolean
+      Set to True to compute the expected results of the n_games_test
+      games exactly instead of playing them (see 
+      train.evaluate_vs_random): scores are then real numbers.
+    workers: int (or None)
+      If given, the trainings of the different values of epsilon and 
+      kinds of opponent are run by a pool of workers processes, with 
+      one log file for each of them (see run_jobs).
 
     Outputs
     -------
@@ -99,12 +126,12 @@ class Optimizer:
       File in which each line corresponds to an epoch test result:
       'epoch, score of RL agent, number of finished games, 
       n_games_test'.
-    * CSV model: CSV file
+    * Model: binary file (see model_io)
       Located at:
-      'Models/greedy_(epsilon_value)_vs(Random/Self).csv'
+      'Models/greedy_(epsilon_value)_vs(Random/Self).model'
       File storing the Q-function of the model trained after 
-      n_epochs. The counter of state-action pairs is also stored at:
-      'Models/data/count_greedy_(epsilon_value)_vs_(Random/self).csv'.
+      n_epochs, along with the counter of state-action pairs and
+      the history of training.
     Only once:
     * Tournament report: CSV file
       Located at: 'Models/results/(self.tournament_name).csv'.
@@ -133,118 +160,19 @@ class Optimizer:
       # True must be the 1st element 
       invert_choices = [True, False]
 
-    problems = []
-
-    for random_opponent in random_choices:
-      # Effective opponent
-      random_opp = random_opponent
-      opp = ('Random' * int(random_opponent) + 
-              'Self' * (1 - int(random_opponent)))
-    
-      for invert_opp in invert_choices:
-        new_opp = ''
-        if invert_opp:
-          # Change opponent
-          random_opp = not random_opp
-          new_opp = ('vsSelf' * int(random_opponent) + 
-                      'vsRandom' * (1 - int(random_opponent)))
-
-        for epsilon in self.epsilon_values:
-          print('epsilon = ', epsilon)
-          if retrain:
-            print('Previously trained vs ' + str(opp))
-
-          # Output GS filename
-          output_path = ('Models/train/GS_epsilon_' + 
-                          str(epsilon)[0] + '_' + 
-                          str(epsilon)[2:] + '_vs' + 
-                          opp + '.txt')
-
-          # Name of CSV model
-          model_filename = ('greedy' + str(epsilon)[0] + '_' + 
-                            str(epsilon)[2:] + '_vs' + opp)
-
-          # Previous number of epochs used for training
-          prev_epochs = 0
-        
-          # Prepare output file
-          if not retrain:
-            load_model = None
-
-            # Initialize output file
-            with open(output_path, "w") as f:
-              f.write('Grid-Search\nrandom opponent: ' + 
-                      str(random_opponent) + '\nepsilon= ' + 
-                      str(epsilon) + 
-                      '\n------------------------------\n')
-          else:
-            load_model = model_filename
-
-            # Update prev_epochs
-            prev_epochs = self.find_prev_epochs(epsilon, opp)
-
-            if invert_opp:
-              # Prepare output file: copy original results 
-              # to add results of future training by 
-              # changing the opponent
-              output_path2 = ('Models/train/GS_epsilon_' + 
-                                str(epsilon)[0] + '_' + 
-                                str(epsilon)[2:] + '_vs' + 
-                                opp + new_opp + '.txt')
-              with open(output_path, 'r') as file_1:
-                with open(output_path2, 'w') as file_2:
-                  for line in file_1:
-                    if 'random' in line:
-                      line = line[:-1] + str(' then ' +str(random_opp) + '\n')
-                    file_2.write(line)
-                  file_2.write('------------------------------\n')
-
-              output_path = output_path2
-              model_filename = model_filename + new_opp 
-
-          # Create temp file if model already exists
-          if os.path.exists('Models/' + model_filename + '.csv'):
-            model_filename = model_filename + '_temp'
-      
-          learning_results = train(n_epochs = n_epochs, 
-                                    epsilon = epsilon, gamma = 1.0, 
-                                    load_model = load_model, 
-                                    filename = model_filename,
-                                    random_opponent = random_opp, 
-                                    n_games_test = n_games_test,
-                                    freq_test = freq_test, 
-                                    n_skip_games = -1, verbose = False)
-
-          assert len(learning_results) != 0, 'Problem here'
-      
-          # Keep best model and delete temp files
-          use_training = self.delete_temp(load_model, model_filename)
-
-          # Store results if trained model is better / before
-          if use_training:
-            with open(output_path, "a") as f:
-              for result in learning_results:
-                f.write(str(result[0] + prev_epochs) + ',' +
-                        str(result[1]) + ',' + 
-                        str(result[2]) + ',' + 
-                        str(result[3]) + '\n')
-
-          # Just expectations of results
-          if not retrain:
-            rate_success = 0.95
-          else:
-            rate_success = 0.99
-          if (not (result[2] == result[3]) or 
-            not (result[1] >= rate_success * result[2])):
-            print('At the end of training, the RL Agent has won ' +
-                'only {}/{} games.'.format(result[1], result[3]))
-            problems.append([epsilon, random_opp])
-
-          # Display the ineffectiveness of training
-          if not use_training:
-            print('Trained agent is worse than before training.')
-      
-          print('\n-----------\n')
+    # One job for each kind of opponent and each value of epsilon: 
+    # jobs use different models and files. The changes of opponent of 
+    # a model are done in the same job, before the model is retrained
+    jobs = [ (epsilon, random_opponent) for random_opponent in random_choices
+              for epsilon in self.epsilon_values ]
+    names = [ 'GS_epsilon_' + str(epsilon)[0] + '_' + str(epsilon)[2:] + 
+              '_vs' + ('Random' if random_opponent else 'Self') 
+              for epsilon, random_opponent in jobs ]
+    outputs = self.run_jobs(self.grid_search_job, 
+                  [ (epsilon, random_opponent, invert_choices, n_epochs, 
+                      n_games_test, freq_test, retrain, exact_test) 
+                    for epsilon, random_opponent in jobs ], names, workers)
+    problems = [ problem for output in outputs for problem in output ]
 
     if len(problems) > 0:
       print('Problem with training of the following agents: ', problems, 
@@ -261,6 +189,197 @@ class Optimizer:
     self.tournament(change_opp = change_opp)
 
 
+  def run_jobs(self, job, jobs_args, names, workers = None):
+    """
+    Run jobs (method of Optimizer) one after another, or on a pool of 
+    processes. In the latter case, the output of each job is written 
+    in its own log file 'Models/logs/(name).log'. Jobs must use 
+    different models and files.
+
+    Parameters
+    ----------
+    job: method of Optimizer.
+    jobs_args: list of tuples
+      Arguments of each job.
+    names: list of string
+      Names of jobs (and of their log files).
+    workers: int (or None)
+      Number of processes. If None, jobs are run in the current 
+      process and print their output.
+
+    Return
+    ------
+    outputs: list
+      Output of each job, in the order of jobs_args.
+    """
+
+    if workers is None:
+      return [ job(*args) for args in jobs_args ]
+
+    os.makedirs(LOGS_DIR, exist_ok = True)
+    log_paths = [ os.path.join(LOGS_DIR, name + '.log') for name in names ]
+    print('{} jobs on {} workers (logs in {})'.format(len(jobs_args), 
+                                                      workers, LOGS_DIR))
+    outputs = []
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+      futures = [ pool.submit(run_logged, job, args, log_path) 
+                  for args, log_path in zip(jobs_args, log_paths) ]
+      # Collect outputs in order
+      for name, future in zip(names, futures):
+        outputs.append(future.result())
+        print('Done:', name)
+    print()
+    return outputs
+
+
+  def grid_search_job(self, epsilon, random_opponent, invert_choices, 
+                      n_epochs, n_games_test, freq_test, retrain, 
+                      exact_test):
+    """
+    Training of grid_search for a value of epsilon and a kind of 
+    opponent, for each change of opponent of invert_choices (in order).
+
+    Parameters
+    ----------
+    epsilon: float
+      Parameter of agent during training.
+    random_opponent: boolean
+      Kind of opponent of the model (before a change of opponent).
+    invert_choices: list of boolean
+      Changes of opponent (True: change of opponent).
+    n_epochs, n_games_test, freq_test, retrain, exact_test:
+      Same as in grid_search.
+
+    Return
+    ------
+    problems: list
+      [epsilon, random opponent] for each training whose last test 
+      is below expectations.
+    """
+
+    problems = []
+
+    # Effective opponent
+    random_opp = random_opponent
+    opp = ('Random' * int(random_opponent) + 
+            'Self' * (1 - int(random_opponent)))
+
+    for invert_opp in invert_choices:
+      new_opp = ''
+      if invert_opp:
+        # Change opponent
+        random_opp = not random_opp
+        new_opp = ('vsSelf' * int(random_opponent) + 
+                    'vsRandom' * (1 - int(random_opponent)))
+
+      print('epsilon = ', epsilon)
+      if retrain:
+        print('Previously trained vs ' + str(opp))
+
+      # Output GS filename
+      output_path = ('Models/train/GS_epsilon_' + 
+                      str(epsilon)[0] + '_' + 
+                      str(epsilon)[2:] + '_vs' + 
+                      opp + '.txt')
+
+      # Name of CSV model
+      model_filename = ('greedy' + str(epsilon)[0] + '_' + 
+                        str(epsilon)[2:] + '_vs' + opp)
+
+      # Previous number of epochs used for training
+      prev_epochs = 0
+      copied_lines = None
+
+      # Prepare output file
+      if not retrain:
+        load_model = None
+
+        # Initialize output file
+        with open(output_path, "w") as f:
+          f.write('Grid-Search\nrandom opponent: ' + 
+                  str(random_opponent) + '\nepsilon= ' + 
+                  str(epsilon) + 
+                  '\n------------------------------\n')
+      else:
+        load_model = model_filename
+
+        # Update prev_epochs
+        prev_epochs = self.find_prev_epochs(epsilon, opp)
+
+        if invert_opp:
+          # Prepare output file: copy original results 
+          # to add results of future training by 
+          # changing the opponent (written if training is kept)
+          output_path2 = ('Models/train/GS_epsilon_' + 
+                            str(epsilon)[0] + '_' + 
+                            str(epsilon)[2:] + '_vs' + 
+                            opp + new_opp + '.txt')
+          copied_lines = []
+          with open(output_path, 'r') as file_1:
+            for line in file_1:
+              if 'random' in line:
+                line = line[:-1] + str(' then ' +str(random_opp) + '\n')
+              copied_lines.append(line)
+          copied_lines.append('------------------------------\n')
+
+          output_path = output_path2
+          model_filename = model_filename + new_opp 
+
+      # Create temp file if model already exists
+      trained_model = model_filename
+      if model_exists(model_filename):
+        model_filename = model_filename + '_temp'
+
+      learning_results = train(n_epochs = n_epochs, 
+                                epsilon = epsilon, gamma = 1.0, 
+                                load_model = load_model, 
+                                filename = model_filename,
+                                random_opponent = random_opp, 
+                                n_games_test = n_games_test,
+                                freq_test = freq_test, 
+                                n_skip_games = -1, verbose = False,
+                                exact_test = exact_test)
+
+      assert len(learning_results) != 0, 'Problem here'
+
+      # Keep best model and delete temp files (a new model replaces 
+      # the previous one)
+      use_training = self.delete_temp(trained_model, model_filename, 
+                                      compare = retrain)
+
+      # Store results if trained model is better / before
+      if use_training:
+        if copied_lines is not None:
+          with open(output_path, "w") as f:
+            f.writelines(copied_lines)
+        with open(output_path, "a") as f:
+          for result in learning_results:
+            f.write(str(result[0] + prev_epochs) + ',' +
+                    str(result[1]) + ',' + 
+                    str(result[2]) + ',' + 
+                    str(result[3]) + '\n')
+
+      # Just expectations of results
+      if not retrain:
+        rate_success = 0.95
+      else:
+        rate_success = 0.99
+      result = learning_results[-1]
+      if (not (result[2] == result[3]) or 
+        not (result[1] >= rate_success * result[2])):
+        print('At the end of training, the RL Agent has won ' +
+            'only {}/{} games.'.format(result[1], result[3]))
+        problems.append([epsilon, random_opp])
+
+      # Display the ineffectiveness of training
+      if not use_training:
+        print('Trained agent is worse than before training.')
+
+      print('\n-----------\n')
+
+    return problems
+
+
   def find_prev_epochs(self, epsilon, training_way):
     """
     Find number of epochs previously used to train a given model. 
@@ -296,7 +415,7 @@ class Optimizer:
     return n_epochs
 
 
-  def delete_temp(self, old_model, temp_model):
+  def delete_temp(self, model, temp_model, compare = True):
     """
     Delete temporary files in case of 2 versions of same model 
     (but different times of training). Keep the best model and 
@@ -304,10 +423,14 @@ class Optimizer:
 
     Parameters
     ----------
-    old_model: string
-      Model filename before training.
+    model: string
+      Model filename used by the training.
     temp_model: string
-      Temporary model filename (after training).
+      Filename of the trained model: model + '_temp' if model 
+      already existed, model otherwise.
+    compare: boolean
+      Set to False to replace the previous version of model by the 
+      trained one without confronting them.
 
     Return
     ------
@@ -318,10 +441,14 @@ class Optimizer:
 
     use_training = True
     # Several versions of same model
-    if (old_model is not None) and (temp_model == old_model + '_temp'):
+    if temp_model == model + '_temp':
+      if not compare:
+        rename_model(temp_model, model)
+        return use_training
+
       # Confront them
       agent1 = RLAgent()
-      agent1.load_model(old_model)
+      agent1.load_model(model)
       agent2 = RLAgent()
       agent2.load_model(temp_model)
       results = compare_agents(agent1, agent2, n_games = 10, 
@@ -330,16 +457,10 @@ class Optimizer:
       # Keep best
       if results[3] >= results[2]:
         # More trained agent is the best
-        os.remove('Models/' + old_model + '.csv')
-        os.remove('Models/data/count_' + old_model + '.csv')
-        os.rename(r'Models/' + temp_model + '.csv', 
-                  r'Models/' + old_model + '.csv')
-        os.rename(r'Models/data/count_' + temp_model + '.csv', 
-                  r'Models/data/count_' + old_model + '.csv')
+        rename_model(temp_model, model)
       else:
         # Less trained agent is the best
-        os.remove('Models/' + temp_model + '.csv')
-        os.remove('Models/data/count_' + temp_model + '.csv')
+        remove_model(temp_model)
         use_training = False
     return use_training
 
@@ -350,10 +471,12 @@ class Optimizer:
     For the values of the factor epsilon of an RL Agent, declared 
     in init method, this method creates a tournament for the 
     corresponding different models. Each model plays 10 games 
-    against all others and the scores of each model against another 
-    are stored in a CSV file. A TXT file is also generated using
-    the CSV file: it displays rankings of each model, alongside
-    its total score against all other models.
+    against all others (all matches are played at once with the 
+    compiled policies of models, see train.compare_policies) and the 
+    scores of each model against another are stored in a CSV file. 
+    A TXT file is also generated using the CSV file: it displays 
+    rankings of each model, alongside its total score against all 
+    other models.
 
     Parameter
     ---------
@@ -401,57 +524,45 @@ class Optimizer:
     players = [ [epsilon, training_way] for epsilon in self.epsilon_values 
                       for training_way in training_ways]
 
+    # Compiled policies of players
+    policies = []
     for idx1, player1 in enumerate(players):
       epsilon1 = player1[0]
       training_way1 = player1[1]
       filename = ('greedy' + str(epsilon1)[0] + '_' + 
                   str(epsilon1)[2:] + '_vs' + training_way1)
 
-      # Load first agent
+      # Load agent
       agent1 = RLAgent()
       agent1.load_model(filename)
+      policies.append(agent1.compile_policy())
 
-      # Save config of agent1
+      # Save config of agent as player 1 (rows) and player 2 (columns)
       scores[idx1+3, 0] = epsilon1
+      scores[0, idx1+3] = epsilon1
       # 0: RANDOM | 1: SELF
       scores[idx1+3, 1] = (int(training_way1 == 'Self') + 
                             int(training_way1 == 'SelfvsRandom'))
+      scores[1, idx1+3] = scores[idx1+3, 1]
       # -1: nothing | 0: Random vs Self | 1: Self vs Random
       scores[idx1+3, 2] = -1+(2 * int(training_way1 == 'SelfvsRandom') +
                                   int(training_way1 == 'RandomvsSelf')) 
-
-      for idx2, player2 in enumerate(players):
-        epsilon2 = player2[0]
-        training_way2 = player2[1]
-        filename = ('greedy' + str(epsilon2)[0] + '_' + 
-                    str(epsilon2)[2:] + '_vs' + training_way2)
-
-        # Load second agent
-        agent2 = RLAgent()
-        agent2.load_model(filename)
-
-        # Save config of agent2
-        scores[0, idx2+3] = epsilon2
-        scores[1, idx2+3] = (int(training_way2 == 'Self') + 
-                              int(training_way2 == 'SelfvsRandom'))
-        scores[2, idx2+3] = -1+(2*int(training_way2 == 'SelfvsRandom')+
-                                int(training_way2 == 'RandomvsSelf')) 
-
-        print('Current match:')
-        print('Player1: epsilon = {}, trained vs {}'.format(epsilon1, 
-                                                            training_way1))
-        print('Player2: epsilon = {}, trained vs {}'.format(epsilon2, 
-                                                            training_way2))
-
-        results = compare_agents(agent1, agent2, n_games = 10, 
-                                  time_limit = 100, verbose = False)
-
+      scores[2, idx1+3] = scores[idx1+3, 2]
+
+    # All matches of 10 games at once (see train.compare_policies)
+    start = time.perf_counter()
+    results = compare_policies(policies, n_games = 10, time_limit = 100)
+    print('{} matches played in {:.2f} s'.format(len(players)**2, 
+                                          time.perf_counter() - start))
+
+    # Scores in the order of matches (the last match between 2 agents 
+    # gives their scores)
+    for idx1 in range(len(players)):
+      for idx2 in range(len(players)):
         # Score of agent1
-        scores[idx1+3, idx2+3] = results[2]
+        scores[idx1+3, idx2+3] = results[idx1, idx2, 0]
         # Score of agent2
-        scores[idx2+3, idx1+3] = results[3]
-
-        print('------')
+        scores[idx2+3, idx1+3] = results[idx1, idx2, 1]
 
     # Update tournament file name
     name = self.tournament_name[:-1]
@@ -466,8 +577,11 @@ class Optimizer:
     # Rank players
     self.tournament_ranking(self.tournament_name, self.tournament_name)
 
-    print('Results of tournament are stored in {}.csv and {}.txt\n'.format(
+    print('Results of tournament are stored in {}.csv and {}.txt'.format(
                   self.tournament_name, self.tournament_name))
+    stats = MODEL_CACHE.stats()
+    print('Loaded models: {} hits, {} misses in cache\n'.format(
+                  stats['hits'], stats['misses']))
 
 
   def tournament_ranking(self, input_filename, output_filename):
@@ -537,7 +651,7 @@ class Optimizer:
 
 
   def retrain_best_models(self, n_epochs, common_train_time = False, 
-                                                      min_frac = 0.3):
+                                            min_frac = 0.3, workers = None):
     """
     Looks at previous tournament ranking TXT file (whose name is
     self.tournament_name) and selects some of the best current 
@@ -562,6 +676,9 @@ class Optimizer:
       the models with total score above max_score * min_frac are 
       retrained (max_score is the maximum score achieved by a 
       model during latter tournament).
+    workers: int (or None)
+      If given, the models are retrained by a pool of workers 
+      processes, with one log file for each model (see run_jobs).
 
     Outputs
     -------
@@ -597,60 +714,27 @@ class Optimizer:
 
     print('New training of currently best models')
     print('--------------------------------------\n')
+    jobs = []
     for model in best_models:
       # Get info
       epsilon = model[0]
       if epsilon not in epsilon_values:
         epsilon_values.append(epsilon)
       training_way = model[1]
-      training_ways = training_way.split('vs')
-      last_training_way = training_ways[-1]
-      assert (last_training_way == 'Self' or 
-          last_training_way == 'Random'), \
-          'Last method of training is not clear: {}'.format(last_training_way)
       prev_epochs = model[2]
-      print('epsilon = ', epsilon)
-      print('Trained before vs ' + training_way + ' during ' + 
-              str(prev_epochs) + ' epochs.')
-
-      # Define training method
-      if last_training_way == 'Random':
-        random_opponent = True
-      else:
-        random_opponent = False
-
-      # Name of CSV model
-      load_model = ('greedy' + str(epsilon)[0] + '_' + 
-                    str(epsilon)[2:] + '_vs' + training_way)
-
-      if os.path.exists('Models/' + load_model + '.csv'):
-        model_filename = load_model + '_temp'
 
       # Training time
       if common_train_time:
         epochs = n_epochs + max_epochs - prev_epochs
       else:
         epochs = n_epochs
+      jobs.append((epsilon, training_way, prev_epochs, epochs, n_epochs))
 
-      _ = train(n_epochs = epochs, epsilon = epsilon, gamma = 1.0, 
-                load_model = load_model, filename = model_filename,
-                random_opponent = random_opponent, n_games_test = 0, 
-                freq_test = -1, n_skip_games = -1, verbose = False)
-
-      use_training = self.delete_temp(load_model, model_filename)
-
-      # Touch file to update number of epochs used to train the model
-      if use_training:
-        output_path = ('Models/train/GS_epsilon_' + str(epsilon)[0] + 
-                        '_' + str(epsilon)[2:] + '_vs' + 
-                        str(training_way) + '.txt')
-        with open(output_path, "a") as f:
-          f.write(str(n_epochs + prev_epochs) + ',' + str(-1) + 
-                    ',' + str(-1) + ',' + str(-1) + '\n')
-      else:
-        print('Trained agent is worse than before training.')
-
-      print('--------------------------------------\n')
+    # One job for each model
+    names = [ 'retrain_epsilon_' + str(epsilon)[0] + '_' + str(epsilon)[2:] + 
+              '_vs' + training_way for epsilon, training_way, _, _, _ in jobs ]
+    assert len(set(names)) == len(names), 'Several jobs for a model.'
+    self.run_jobs(self.retrain_job, jobs, names, workers)
 
     # Keep only best values in memory
     self.epsilon_values = epsilon_values
@@ -659,6 +743,70 @@ class Optimizer:
     self.tournament(change_opp = self.change_opp)
 
 
+  def retrain_job(self, epsilon, training_way, prev_epochs, epochs, 
+                                                            n_epochs):
+    """
+    Training of a model of retrain_best_models.
+
+    Parameters
+    ----------
+    epsilon: float
+      Parameter of agent during training.
+    training_way: string
+      Opponents of agent during previous trainings (Random, Self, 
+      RandomvsSelf...).
+    prev_epochs: int
+      Number of epochs previously used to train the model.
+    epochs: int
+      Number of epochs of training.
+    n_epochs: int
+      Number of epochs added to the history of the model.
+    """
+
+    training_ways = training_way.split('vs')
+    last_training_way = training_ways[-1]
+    assert (last_training_way == 'Self' or 
+        last_training_way == 'Random'), \
+        'Last method of training is not clear: {}'.format(last_training_way)
+    print('epsilon = ', epsilon)
+    print('Trained before vs ' + training_way + ' during ' + 
+            str(prev_epochs) + ' epochs.')
+
+    # Define training method
+    if last_training_way == 'Random':
+      random_opponent = True
+    else:
+      random_opponent = False
+
+    # Name of CSV model
+    load_model = ('greedy' + str(epsilon)[0] + '_' + 
+                  str(epsilon)[2:] + '_vs' + training_way)
+
+    model_filename = load_model
+    if model_exists(load_model):
+      model_filename = load_model + '_temp'
+
+    _ = train(n_epochs = epochs, epsilon = epsilon, gamma = 1.0, 
+              load_model = load_model, filename = model_filename,
+              random_opponent = random_opponent, n_games_test = 0, 
+              freq_test = -1, n_skip_games = -1, verbose = False)
+
+    use_training = self.delete_temp(load_model, model_filename)
+
+    # Touch file to update number of epochs used to train the model
+    if use_training:
+      output_path = ('Models/train/GS_epsilon_' + str(epsilon)[0] + 
+                      '_' + str(epsilon)[2:] + '_vs' + 
+                      str(training_way) + '.txt')
+      with open(output_path, "a") as f:
+        f.write(str(n_epochs + prev_epochs) + ',' + str(-1) + 
+                  ',' + str(-1) + ',' + str(-1) + '\n')
+    else:
+      print('Trained agent is worse than before training.')
+
+    print('--------------------------------------\n')
+
+
 if __name__ == "__main__":
 
   epsilon_values = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]  
@@ -675,11 +823,13 @@ if __name__ == "__main__":
 
   # First training with simple opponents
   optimizer.grid_search(n_epochs = n_epochs, n_games_test = n_games_test, 
-                        freq_test = n_epochs // 5, retrain = False)
+                        freq_test = n_epochs // 5, retrain = False, 
+                        exact_test = True)
   
   # Second training with mixed opponents
   optimizer.grid_search(n_epochs = n_epochs, n_games_test = n_games_test, 
-                        freq_test = n_epochs // 5, retrain = True)
+                        freq_test = n_epochs // 5, retrain = True, 
+                        exact_test = True)
 
   n_epochs = 40000
   # Further training for best current models